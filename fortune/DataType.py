@@ -6,10 +6,12 @@ import itertools
 class Point:
     x = 0.0
     y = 0.0
+    index = -1
 
-    def __init__(self, x, y):
+    def __init__(self, x, y, index=-1):
         self.x = x
         self.y = y
+        self.index = index
 
 
 class Event:
@@ -26,6 +28,7 @@ class Event:
 
 
 class Arc:
+    id = -1
     p = None
     pprev = None
     pnext = None
@@ -43,14 +46,23 @@ class Arc:
 
 
 class Segment:
+    id = -1
     start = None
     end = None
     done = False
+    a = None
+    b = None
+    open_start = False
 
-    def __init__(self, p):
+    def __init__(self, p, a=None, b=None):
         self.start = p
         self.end = None
         self.done = False
+        # the segment comes in from x = -infinity, start is only a point on its line
+        self.open_start = False
+        # the two sites separated by the segment
+        self.a = a
+        self.b = b
 
     def finish(self, p):
         if self.done: return
@@ -59,17 +71,18 @@ class Segment:
 
 
 class PriorityQueue:
-    def __init__(self):
+    def __init__(self, key=None):
         self.pq = []
         self.entry_finder = {}
         self.counter = itertools.count()
+        self.key = key  # priority of an item, its x by default
 
     def push(self, item):
         # check for duplicate
         if item in self.entry_finder: return
         count = next(self.counter)
         # use x-coordinate as a primary key (heapq in python is min-heap)
-        entry = [item.x, count, item]
+        entry = [item.x if self.key is None else self.key(item), count, item]
         self.entry_finder[item] = entry
         heapq.heappush(self.pq, entry)
 
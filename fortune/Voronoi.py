@@ -1,28 +1,54 @@
+import asyncio
 import math
+import time
+
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 
 from fortune.DataType import Arc, Event, Point, PriorityQueue, Segment
+from fortune.adjacency import edges_to_csr, to_matrix
+from fortune.fortune2 import clip_rays
+from fortune.trace import CIRCLE, CLOSE, SITE, STALE
+
+
+class SweepInterrupted(Exception):
+    # raised by a sweep past its time budget or cancelled, with what was done so far
+    def __init__(self, reason, voronoi):
+        Exception.__init__(self, '%s after %d events at x=%s' % (reason, voronoi.events_done, voronoi.sweep))
+        self.reason = reason
+        self.events = voronoi.events_done
+        self.sweep = voronoi.sweep
+        # the segments finished behind the sweep line; a streamed sweep keeps none of them, the
+        # consumer already holds the ones yielded and partial only has those not yielded yet
+        self.partial = [(o.start.x, o.start.y, o.end.x, o.end.y) for o in voronoi.output + voronoi.ready if o.done]
 
 
 class Voronoi:
-    def __init__(self, points):
+    def __init__(self, points, record_triangles=False, trace=None):
         self.output = []  # list of line segment
+        self.triangles = [] if record_triangles else None  # Delaunay triangles, one per circle event
+        self.trace = trace  # a fortune.trace.SweepTrace recording every event, or None
         self.arc = None  # binary tree for parabola arcs
+        self.stream = False  # emit finished segments through self.ready instead of self.output
+        self.ready = []
+        self.events_done = 0
+        self.sweep = None  # x of the last event handled
 
-        self.points = PriorityQueue()  # site events
+        # site events, the ones with equal x from low to high y so that they stack up on the beach line
+        self.points = PriorityQueue(key=lambda p: (p.x, p.y))
         self.event = PriorityQueue()  # circle events
 
-        # bounding box
-        self.x0 = -50.0
-        self.x1 = -50.0
-        self.y0 = 550.0
-        self.y1 = 550.0
+        # bounding box of the sites
+        self.x0 = math.inf
+        self.x1 = -math.inf
+        self.y0 = math.inf
+        self.y1 = -math.inf
 
         # insert points to site event
-        for pts in points:
-            point = Point(pts[0], pts[1])
+        self.n = len(points)
+        for index, pts in enumerate(points):
+            point = Point(pts[0], pts[1], index)
             self.points.push(point)
             # keep track of bounding box size
             if point.x < self.x0: self.x0 = point.x
@@ -30,7 +56,10 @@ class Voronoi:
             if point.x > self.x1: self.x1 = point.x
             if point.y > self.y1: self.y1 = point.y
 
-        # add margins to the bounding box
+        # add margins to the bounding box, only used to close the unbounded edges in finish_edges
+        if not self.n:
+            self.x0 = self.y0 = 0.0
+            self.x1 = self.y1 = 0.0
         dx = (self.x1 - self.x0 + 1) / 5.0
         dy = (self.y1 - self.y0 + 1) / 5.0
         self.x0 = self.x0 - dx
@@ -38,35 +67,211 @@ class Voronoi:
         self.y0 = self.y0 - dy
         self.y1 = self.y1 + dy
 
-    def process(self):
-        while not self.points.empty():
+    def process(self, stream=False, budget=None, cancel=None, check_every=1000):
+        # with stream=True, return a generator of segments as soon as they are finished;
+        # budget (seconds) and cancel (anything with is_set(), e.g. threading.Event) are
+        # checked every check_every events and end the sweep with SweepInterrupted
+        if stream:
+            return self.iter_segments(budget, cancel, check_every)
+        for _ in self.steps(budget, cancel, check_every):
+            pass
+
+    def steps(self, budget=None, cancel=None, check_every=1000):
+        # generator advancing the sweep by check_every events per iteration
+        deadline = None if budget is None else time.monotonic() + budget
+        while True:
+            for _ in range(check_every):
+                if not self.step():
+                    return
+            self.check(deadline, cancel)
+            yield self.events_done
+
+    async def process_async(self, budget=None, cancel=None, check_every=1000):
+        # cooperative sweep inside an event loop, control goes back to the loop every check_every events
+        for _ in self.steps(budget, cancel, check_every):
+            await asyncio.sleep(0)
+
+    def check(self, deadline, cancel):
+        if cancel is not None and cancel.is_set():
+            raise SweepInterrupted('cancelled', self)
+        if deadline is not None and time.monotonic() > deadline:
+            raise SweepInterrupted('time budget exceeded', self)
+
+    def step(self):
+        # handle the next event, False once both queues are empty
+        self.events_done += 1
+        if not self.points.empty():
             if not self.event.empty() and (self.event.top().x <= self.points.top().x):
                 self.process_event()  # handle circle event
             else:
                 self.process_point()  # handle site event
+            return True
 
         # after all points, process remaining circle events
-        while not self.event.empty():
+        if not self.event.empty():
             self.process_event()
+            return True
+        self.events_done -= 1
+        return False
+
+    def iter_segments(self, budget=None, cancel=None, check_every=1000):
+        # segments are not kept in self.output, the edges still open at the end
+        # are closed by finish_edges and come last; a segment leaves self.ready as it
+        # is yielded, so a checkpoint taken between two segments does not repeat any
+        self.stream = True
+        deadline = None if budget is None else time.monotonic() + budget
+        while self.step():
+            if self.events_done % check_every == 0:
+                self.check(deadline, cancel)
+            while self.ready:
+                yield self.ready.pop(0)
+        self.finish_edges()
+        while self.ready:
+            yield self.ready.pop(0)
+
+    def checkpoint(self, path):
+        # save the state of a sweep stopped between two events (e.g. between iterations of
+        # steps()) as flat arrays in an .npz file, Voronoi.resume(path) carries on from there
+        sites = {}
+        for entry in self.points.pq:
+            sites[entry[2].index] = entry[2]
+        arcs = []
+        i = self.arc
+        while i is not None:
+            arcs.append(i)
+            sites[i.p.index] = i.p
+            i = i.pnext
+        arc_id = dict((id(a), k) for k, a in enumerate(arcs))
+
+        # emitted segments and the ones still open on the beach line, each once
+        segments = []
+        seg_id = {}
+        for s in self.output + self.ready + [s for a in arcs for s in (a.s0, a.s1) if s is not None]:
+            if id(s) not in seg_id:
+                seg_id[id(s)] = len(segments)
+                segments.append(s)
+        for s in segments:
+            for p in (s.a, s.b):
+                if p is not None:
+                    sites[p.index] = p
+
+        # queues in pop order, the heap counters are renumbered on resume
+        pending = [e[2] for e in sorted(self.points.pq, key=lambda e: e[:2])]
+        events = [e[2] for e in sorted(self.event.pq, key=lambda e: e[:2]) if e[2] != 'Removed']
+        event_id = dict((id(e), k) for k, e in enumerate(events))
+
+        n = len(sites)
+        site_index = np.array(sorted(sites), dtype=np.int64)
+        end = np.array([(s.end.x, s.end.y) if s.end is not None else (np.nan, np.nan) for s in segments])
+        np.savez_compressed(
+            path,
+            meta=np.array([self.n, self.events_done, self.stream, self.triangles is not None], dtype=np.int64),
+            box=np.array([self.x0, self.x1, self.y0, self.y1, np.nan if self.sweep is None else self.sweep]),
+            site_index=site_index,
+            site_xy=np.array([(sites[k].x, sites[k].y) for k in site_index], dtype=float).reshape(n, 2),
+            pending=np.array([p.index for p in pending], dtype=np.int64),
+            event_xy=np.array([(e.x, e.p.x, e.p.y) for e in events], dtype=float).reshape(-1, 3),
+            event_arc=np.array([arc_id.get(id(e.a), -1) for e in events], dtype=np.int64),
+            event_valid=np.array([e.valid for e in events], dtype=bool),
+            arcs=np.array([(a.p.index,
+                            -1 if a.s0 is None else seg_id[id(a.s0)],
+                            -1 if a.s1 is None else seg_id[id(a.s1)],
+                            event_id.get(id(a.e), -1)) for a in arcs], dtype=np.int64).reshape(-1, 4),
+            seg_xy=np.array([(s.start.x, s.start.y) for s in segments], dtype=float).reshape(-1, 2),
+            seg_end=end.reshape(-1, 2),
+            seg_done=np.array([s.done for s in segments], dtype=bool),
+            seg_open=np.array([s.open_start for s in segments], dtype=bool),
+            seg_sites=np.array([(-1 if s.a is None else s.a.index, -1 if s.b is None else s.b.index)
+                                for s in segments], dtype=np.int64).reshape(-1, 2),
+            output=np.array([seg_id[id(s)] for s in self.output], dtype=np.int64),
+            ready=np.array([seg_id[id(s)] for s in self.ready], dtype=np.int64),
+            triangles=np.array(self.triangles or [], dtype=np.int64).reshape(-1, 3),
+        )
+
+    @classmethod
+    def resume(cls, path):
+        # rebuild a sweep saved by checkpoint, possibly in another process
+        data = np.load(path)
+        n, events_done, stream, record = data['meta'].tolist()
+        v = cls([], record_triangles=bool(record))
+        v.n = n
+        v.events_done = events_done
+        v.stream = bool(stream)
+        v.x0, v.x1, v.y0, v.y1, sweep = data['box'].tolist()
+        v.sweep = None if math.isnan(sweep) else sweep
+        sites = dict((k, Point(x, y, k)) for k, (x, y) in zip(data['site_index'].tolist(), data['site_xy'].tolist()))
+        for k in data['pending'].tolist():
+            v.points.push(sites[k])
+
+        segments = []
+        for (x, y), (ex, ey), done, open_start, (a, b) in zip(
+                data['seg_xy'].tolist(), data['seg_end'].tolist(), data['seg_done'].tolist(),
+                data['seg_open'].tolist(), data['seg_sites'].tolist()):
+            s = Segment(Point(x, y), sites.get(a), sites.get(b))
+            s.open_start = open_start
+            if done:
+                s.finish(Point(ex, ey))
+            segments.append(s)
+        v.output = [segments[k] for k in data['output'].tolist()]
+        v.ready = [segments[k] for k in data['ready'].tolist()]
+
+        arcs = []
+        for p, s0, s1, e in data['arcs'].tolist():
+            a = Arc(sites[p], arcs[-1] if arcs else None)
+            if arcs:
+                arcs[-1].pnext = a
+            a.s0 = segments[s0] if s0 >= 0 else None
+            a.s1 = segments[s1] if s1 >= 0 else None
+            arcs.append(a)
+        v.arc = arcs[0] if arcs else None
+
+        events = []
+        for (x, ox, oy), k, valid in zip(data['event_xy'].tolist(), data['event_arc'].tolist(),
+                                         data['event_valid'].tolist()):
+            e = Event(x, Point(ox, oy), arcs[k] if k >= 0 else None)
+            e.valid = valid
+            v.event.push(e)
+            events.append(e)
+        for a, k in zip(arcs, data['arcs'][:, 3].tolist()):
+            a.e = events[k] if k >= 0 else None
+        if record:
+            v.triangles = [tuple(t) for t in data['triangles'].tolist()]
+        return v
+
+    def start_segment(self, seg):
+        if not self.stream:
+            self.output.append(seg)
 
+    def finish_segment(self, seg, p):
+        if seg.done: return
+        seg.finish(p)
+        if self.stream:
+            self.ready.append(seg)
 
     def process_point(self):
         # get next event from site pq
         p = self.points.pop()
+        self.sweep = p.x
         # add new arc (parabola)
         self.arc_insert(p)
 
     def process_event(self):
         # get next event from circle pq
         e = self.event.pop()
+        self.sweep = e.x
 
         if e.valid:
+            a = e.a
+
             # start new edge
-            s = Segment(e.p)
-            self.output.append(s)
+            s = Segment(e.p, a.pprev.p, a.pnext.p)
+            self.start_segment(s)
+
+            # the three arcs meeting at e.p are a Delaunay triangle, stored counter-clockwise
+            if self.triangles is not None:
+                self.triangles.append((a.pnext.p.index, a.p.index, a.pprev.p.index))
 
             # remove associated arc (parabola)
-            a = e.a
             if a.pprev is not None:
                 a.pprev.pnext = a.pnext
                 a.pprev.s1 = s
@@ -74,17 +279,28 @@ class Voronoi:
                 a.pnext.pprev = a.pprev
                 a.pnext.s0 = s
 
+            if self.trace is not None:
+                finished = [t for t in (a.s0, a.s1) if t is not None and not t.done]
+
             # finish the edges before and after a
-            if a.s0 is not None: a.s0.finish(e.p)
-            if a.s1 is not None: a.s1.finish(e.p)
+            if a.s0 is not None: self.finish_segment(a.s0, e.p)
+            if a.s1 is not None: self.finish_segment(a.s1, e.p)
+
+            if self.trace is not None:
+                self.trace.record(e.x, CIRCLE, removed=a.id, started=[self.trace.edge(s)],
+                                  finished=[self.trace.end(t) for t in finished])
 
             # recheck circle events on either side of p
             if a.pprev is not None: self.check_circle_event(a.pprev)
             if a.pnext is not None: self.check_circle_event(a.pnext)
+        elif self.trace is not None:
+            self.trace.record(e.x, STALE)
 
     def arc_insert(self, p):
         if self.arc is None:
             self.arc = Arc(p)
+            if self.trace is not None:
+                self.trace.record(p.x, SITE, arc=self.trace.arc(self.arc))
         else:
             # find the current arcs at p.y
             i = self.arc
@@ -107,14 +323,19 @@ class Voronoi:
                     i = i.pnext  # now i points to the new arc
 
                     # add new half-edges connected to i's endpoints
-                    seg = Segment(z)
-                    self.output.append(seg)
+                    seg = Segment(z, i.pprev.p, p)
+                    self.start_segment(seg)
                     i.pprev.s1 = i.s0 = seg
 
-                    seg = Segment(z)
-                    self.output.append(seg)
+                    seg = Segment(z, p, i.pnext.p)
+                    self.start_segment(seg)
                     i.pnext.s0 = i.s1 = seg
 
+                    if self.trace is not None:
+                        self.trace.record(p.x, SITE, after=i.pprev.id, arc=self.trace.arc(i),
+                                          split=self.trace.arc(i.pnext),
+                                          started=[self.trace.edge(i.s0), self.trace.edge(i.s1)])
+
                     # check for new circle events around the new arc
                     self.check_circle_event(i)
                     self.check_circle_event(i.pprev)
@@ -135,9 +356,12 @@ class Voronoi:
             y = (i.pnext.p.y + i.p.y) / 2.0
             start = Point(x, y)
 
-            seg = Segment(start)
+            seg = Segment(start, i.p, p)
+            seg.open_start = True
             i.s1 = i.pnext.s0 = seg
-            self.output.append(seg)
+            self.start_segment(seg)
+            if self.trace is not None:
+                self.trace.record(p.x, SITE, after=i.id, arc=self.trace.arc(i.pnext), started=[self.trace.edge(seg)])
 
     def check_circle_event(self, i):
         # look for a new circle event for arc i
@@ -223,12 +447,19 @@ class Voronoi:
         return res
 
     def finish_edges(self):
-        l = self.x1 + (self.x1 - self.x0) + (self.y1 - self.y0)
+        # close the edges still open along the rays of get_rays, far enough out to leave the box
+        cx, cy = (self.x0 + self.x1) / 2.0, (self.y0 + self.y1) / 2.0
+        diagonal = math.hypot(self.x1 - self.x0, self.y1 - self.y0)
         i = self.arc
-        while i.pnext is not None:
-            if i.s1 is not None:
-                p = self.intersection(i.p, i.pnext.p, l * 2.0)
-                i.s1.finish(p)
+        while i is not None and i.pnext is not None:
+            if i.s1 is not None and not i.s1.done:
+                o = i.s1.start
+                dx, dy = i.pnext.p.y - i.p.y, i.p.x - i.pnext.p.x
+                t = (math.hypot(o.x - cx, o.y - cy) + diagonal) / math.hypot(dx, dy)
+                p = Point(o.x + t * dx, o.y + t * dy)
+                self.finish_segment(i.s1, p)
+                if self.trace is not None:
+                    self.trace.record(self.sweep, CLOSE, finished=[self.trace.end(i.s1)])
             i = i.pnext
 
     def print_output(self):
@@ -247,14 +478,69 @@ class Voronoi:
             res.append((p0.x, p0.y, p1.x, p1.y))
         return res
 
-
-points = np.random.rand(10, 2) * 100
-vp = Voronoi(points)
-vp.process()
-lines = vp.get_output()
-plt.scatter(points[:, 0], points[:, 1], color="blue")
-lines = np.reshape(lines, (lines.__len__(), 2, 2))
-lines = matplotlib.collections.LineCollection(lines, color='red')
-plt.gca().add_collection(lines)
-plt.axis((-20, 120, -20, 120))
-plt.show()
+    def get_sites(self):
+        # the two site indices separated by each segment of get_output
+        return np.array([(o.a.index, o.b.index) for o in self.output], dtype=np.int64).reshape(-1, 2)
+
+    def get_triangles(self):
+        return np.array(self.triangles, dtype=np.int64).reshape(-1, 3)
+
+    def get_rays(self):
+        # exact form of get_output once the sweep is over, finish_edges or not: the points
+        # origin + t * direction for t within bounds, (0, 1) for a segment, (0, inf) for a ray
+        # and (-inf, inf) for a line (sites all sharing their x)
+        if not (self.points.empty() and self.event.empty()):
+            raise ValueError('the sweep is not finished')
+        # the edges still between two arcs go off to infinity, away from the sweep line
+        # as the breakpoint of the two arcs does
+        away = {}
+        i = self.arc
+        while i is not None and i.pnext is not None:
+            if i.s1 is not None:
+                away[id(i.s1)] = (i.pnext.p.y - i.p.y, i.p.x - i.pnext.p.x)
+            i = i.pnext
+        origin = np.empty((len(self.output), 2))
+        direction = np.empty((len(self.output), 2))
+        bounds = np.empty((len(self.output), 2))
+        for k, o in enumerate(self.output):
+            d = away.get(id(o))
+            if d is not None:
+                origin[k] = (o.start.x, o.start.y)
+                direction[k] = d
+                bounds[k] = (-math.inf if o.open_start else 0.0, math.inf)
+            elif o.open_start:
+                origin[k] = (o.end.x, o.end.y)
+                direction[k] = (-1.0, 0.0)
+                bounds[k] = (0.0, math.inf)
+            else:
+                origin[k] = (o.start.x, o.start.y)
+                direction[k] = (o.end.x - o.start.x, o.end.y - o.start.y)
+                bounds[k] = (0.0, 1.0)
+        return origin, direction, bounds
+
+    def get_clipped(self, bbox, return_sites=False):
+        # the diagram cut to any (xmin, ymin, xmax, ymax) from get_rays, without another sweep
+        S, keep = clip_rays(*self.get_rays(), bbox)
+        if return_sites:
+            return S.reshape(-1, 2, 2), self.get_sites()[keep]
+        return S.reshape(-1, 2, 2)
+
+    def get_adjacency(self, as_matrix=True):
+        # site-to-site adjacency as CSR, from the two sites recorded on each segment
+        pairs = self.get_sites()
+        indptr, indices = edges_to_csr(pairs[:, 0], pairs[:, 1], self.n)
+        if as_matrix:
+            return to_matrix(indptr, indices, self.n)
+        return indptr, indices
+
+
+if __name__ == '__main__':
+    points = np.random.rand(10, 2) * 100
+    vp = Voronoi(points)
+    vp.process()
+    lines = vp.get_clipped((-20, -20, 120, 120))
+    plt.scatter(points[:, 0], points[:, 1], color="blue")
+    lines = matplotlib.collections.LineCollection(lines, color='red')
+    plt.gca().add_collection(lines)
+    plt.axis((-20, 120, -20, 120))
+    plt.show()
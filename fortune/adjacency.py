@@ -0,0 +1,38 @@
+import numpy as np
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+
+def edges_to_csr(i, j, n):
+    # symmetric site-to-site adjacency from an edge list, duplicates and loops dropped
+    i = np.asarray(i, dtype=np.int64).ravel()
+    j = np.asarray(j, dtype=np.int64).ravel()
+    keep = i != j
+    src = np.concatenate((i[keep], j[keep]))
+    dst = np.concatenate((j[keep], i[keep]))
+    src, dst = np.divmod(np.unique(src * n + dst), n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst
+
+
+def to_matrix(indptr, indices, n):
+    # scipy.sparse matrix when SciPy is installed, plain CSR arrays otherwise
+    if sparse is None:
+        return indptr, indices
+    return sparse.csr_matrix((np.ones(indices.size, dtype=bool), indices, indptr), shape=(n, n))
+
+
+def triangles_adjacency(triangles, n, as_matrix=True):
+    # Voronoi neighbours are the Delaunay edges; sites with index >= n are ignored
+    T = np.asarray(triangles, dtype=np.int64)
+    i = T.ravel()
+    j = np.roll(T, -1, axis=1).ravel()
+    keep = (i < n) & (j < n)
+    indptr, indices = edges_to_csr(i[keep], j[keep], n)
+    if as_matrix:
+        return to_matrix(indptr, indices, n)
+    return indptr, indices
@@ -0,0 +1,208 @@
+import argparse
+import json
+import math
+import os
+import platform
+import time
+
+import numpy as np
+
+from fortune import engines
+from fortune.Voronoi import Voronoi
+from fortune.fortune2 import clip_box, collinear_edges, default_bbox, dual_edges, voronoi2_chunked
+from fortune.incremental import Triangulation
+from fortune.snap import snap
+
+TABLE = os.environ.get('FORTUNE_CALIBRATION', os.path.join(os.path.expanduser('~'), '.cache', 'fortune', 'calibration.json'))
+BLOCK = 1 << 16
+
+
+def sweep(P, bbox, workers):
+    v = Voronoi(P)
+    v.process()
+    return v.get_clipped(bbox)
+
+
+def dual(P, bbox, workers):
+    S, _ = clip_box(engines.delaunay_dual(P).reshape(-1, 4), bbox)
+    return S.reshape(-1, 2, 2)
+
+
+def incremental(P, bbox, workers):
+    T, N = Triangulation(P).arrays()
+    return dual_edges(P, T, N, bbox, block=BLOCK, workers=workers)
+
+
+def chunked(P, bbox, workers):
+    return voronoi2_chunked(P, bbox, block=BLOCK, workers=workers)
+
+
+# engine name -> (P, bbox, workers) -> (E, 2, 2) edges clipped to bbox
+CANDIDATES = {
+    'fortune': sweep,
+    'fortune1': dual,
+    'incremental': incremental,
+    'voronoi2': chunked,
+}
+# engines that split their work over threads
+PARALLEL = ('incremental', 'voronoi2')
+
+
+def cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def probe(P):
+    # cheap degeneracy checks, all O(n log n) at most
+    n = P.shape[0]
+    unique = np.unique(P, axis=0).shape[0]
+    centered = P - P.mean(axis=0)
+    s = np.linalg.svd(centered.T @ centered, compute_uv=False) if n > 1 else np.zeros(2)
+    return {
+        'n': n,
+        'duplicates': n - unique,
+        'collinear': bool(n < 3 or s[1] <= 1e-12 * s[0]),
+        # the sweep is fragile on sites with equal x
+        'repeated_x': unique - np.unique(P[:, 0]).size,
+    }
+
+
+def eligible(engine, info):
+    if engine == 'fortune':
+        return info['repeated_x'] == 0
+    # fortune1's slope based circumcircle gives NaN vertices on the axis aligned points at
+    # infinity, it only runs when asked for by name
+    return engine != 'fortune1'
+
+
+def load_table(path=None):
+    try:
+        with open(path or TABLE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def estimate(table, key, n):
+    # seconds at n, interpolated in log-log space between the calibrated sizes, or None
+    seconds = table['seconds'].get(key)
+    if not seconds:
+        return None
+    points = [(math.log(m), math.log(t)) for m, t in zip(table['sizes'], seconds) if t is not None and t > 0]
+    if not points:
+        return None
+    x = math.log(max(n, 1))
+    if len(points) == 1 or x <= points[0][0]:
+        return math.exp(points[0][1] + x - points[0][0])
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        if x <= x1:
+            break
+    # past the largest calibrated size that ran, extrapolate the last slope (at least linear)
+    slope = max((y1 - y0) / (x1 - x0), 1.0) if x > x1 else (y1 - y0) / (x1 - x0)
+    return math.exp(y0 + slope * (x - x0))
+
+
+def choose(info, table=None, workers=None):
+    # (engine, workers, estimated seconds or None) for a probe result
+    available = workers or cores()
+    n = info['n']
+    blocks = max(1, -(-2 * n // BLOCK))  # about 2n triangles
+    if table is None:
+        return 'voronoi2', min(available, blocks), None
+    best = None
+    for key in table['seconds']:
+        engine, _, w = key.partition('/')
+        w = int(w or 1)
+        if engine not in CANDIDATES or not eligible(engine, info) or w > available:
+            continue
+        if w > 1 and (engine not in PARALLEL or w > blocks):
+            continue
+        t = estimate(table, key, n)
+        if t is not None and (best is None or t < best[2]):
+            best = (engine, w, t)
+    return best or ('voronoi2', min(available, blocks), None)
+
+
+def compute_voronoi(points, bbox=None, table=None, workers=None, engine=None, return_plan=False):
+    # one front door for all engines: the edges clipped to bbox (default_bbox of the sites by
+    # default), the engine and its threads picked from the probe and the calibration table (a
+    # dict, a path, or the one written by `python -m fortune.auto calibrate`); voronoi2 and
+    # incremental give every edge once, the sweep splits some in two and fortune1 repeats them
+    P = np.asarray(points, dtype=float).reshape(-1, 2)
+    info = probe(P)
+    if info['duplicates']:
+        P, _ = snap(P)
+    if bbox is None:
+        bbox = default_bbox(P)
+    if not isinstance(table, dict):
+        table = load_table(table)
+    if info['collinear']:
+        plan = ('collinear', 1, None)
+        S = collinear_edges(P, bbox)
+    else:
+        if engine is None:
+            plan = choose(info, table, workers)
+        else:
+            plan = (engine, (workers or 1) if engine in PARALLEL else 1, None)
+        S = CANDIDATES[plan[0]](P, bbox, plan[1])
+    if return_plan:
+        return S, dict(info, engine=plan[0], workers=plan[1], estimate=plan[2])
+    return S
+
+
+def benchmark(sizes=(1000, 10000, 100000), repeat=3, limit=10.0, workers=None, seed=0):
+    # best of repeat seconds of every engine and thread count on uniform random sites, an engine
+    # is dropped from a size once its time there, extrapolated from the smaller sizes, is over
+    # limit seconds
+    available = workers or cores()
+    keys = [e for e in CANDIDATES]
+    w = 2
+    while w <= available:
+        keys += ['%s/%d' % (e, w) for e in PARALLEL]
+        w *= 2
+    seconds = dict((key, []) for key in keys)
+    random = np.random.RandomState(seed)
+    for n in sizes:
+        P = random.rand(n, 2)
+        bbox = default_bbox(P)
+        for key in keys:
+            engine, _, w = key.partition('/')
+            if seconds[key] and (seconds[key][-1] is None or estimate({'sizes': sizes, 'seconds': seconds}, key, n) > limit):
+                seconds[key].append(None)
+                continue
+            best = None
+            for _ in range(repeat):
+                t = time.perf_counter()
+                CANDIDATES[engine](P, bbox, int(w or 1))
+                t = time.perf_counter() - t
+                best = t if best is None else min(best, t)
+                if t > limit:
+                    break
+            seconds[key].append(best)
+    return {'host': platform.node(), 'cores': available, 'sizes': list(sizes), 'seconds': seconds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fortune.auto')
+    sub = parser.add_subparsers(dest='command', required=True)
+    cal = sub.add_parser('calibrate', help='benchmark the engines on this host and write the table')
+    cal.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    cal.add_argument('--repeat', type=int, default=3)
+    cal.add_argument('--limit', type=float, default=10.0, help='seconds after which an engine stops growing')
+    cal.add_argument('--workers', type=int, default=None)
+    cal.add_argument('--out', default=TABLE)
+    args = parser.parse_args(argv)
+    table = benchmark(args.sizes, args.repeat, args.limit, args.workers)
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(table, f, indent=1)
+    print(json.dumps(table, indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import concurrent.futures
+
+import matplotlib.tri
+import numpy as np
+
+from fortune.fortune2 import clip_box, collinear_edges, dual_block
+
+
+def default_boxes(P, offsets):
+    # default_bbox of every diagram, (k, 4)
+    boxes = np.zeros((len(offsets) - 1, 4))
+    full = np.flatnonzero(np.diff(offsets) > 0)
+    if full.size:
+        lo = np.minimum.reduceat(P, offsets[full], axis=0)
+        hi = np.maximum.reduceat(P, offsets[full], axis=0)
+        margin = (hi - lo) * 0.3333333
+        boxes[full] = np.column_stack((lo - margin, hi + margin))
+    return boxes
+
+
+def triangulate_groups(P, offsets, groups):
+    # Delaunay triangles of every diagram in global site indices, with their diagram; the
+    # diagrams qhull cannot triangulate (under three sites, all on a line) are returned apart
+    T, tg, rest = [np.empty((0, 3), dtype=np.int64)], [np.empty(0, dtype=np.int64)], []
+    for g in groups:
+        lo, hi = offsets[g], offsets[g + 1]
+        try:
+            t = matplotlib.tri.Triangulation(P[lo:hi, 0], P[lo:hi, 1]).triangles if hi - lo >= 3 else None
+        except (RuntimeError, ValueError):
+            t = None
+        if t is None:
+            rest.append(g)
+            continue
+        T.append(t + lo)
+        tg.append(np.full(t.shape[0], g, dtype=np.int64))
+    return np.concatenate(T), np.concatenate(tg), rest
+
+
+def neighbors(T, n):
+    # matplotlib.tri neighbours of many triangulations at once: the triangle across the edge
+    # (T[i, j], T[i, j + 1]) is the one holding the same edge the other way round
+    a = T.ravel()
+    b = T[:, [1, 2, 0]].ravel()
+    key = a * n + b
+    order = np.argsort(key)
+    pos = np.minimum(np.searchsorted(key[order], b * n + a), max(key.size - 1, 0))
+    found = key[order][pos] == b * n + a if key.size else np.zeros(0, dtype=bool)
+    return np.where(found, order[pos] // 3, -1).reshape(-1, 3)
+
+
+def dual_rows(P, T, N, boxes, tg):
+    # dual_block over triangles of many diagrams at once, each clipped to the box of its diagram
+    S, sites = dual_block(P, T, N, 0, T.shape[0], boxes[tg])
+    group = np.zeros(P.shape[0], dtype=np.int64)
+    group[T.ravel()] = np.repeat(tg, 3)
+    owner = group[sites[:, 0]]
+    S, keep = clip_box(S, boxes[owner])
+    return S, sites[keep], owner[keep]
+
+
+def single(P, box):
+    # one diagram on its own, edges once with their sites
+    if P.shape[0] < 2:
+        return np.empty((0, 4)), np.empty((0, 2), dtype=np.int64)
+    try:
+        D = matplotlib.tri.Triangulation(P[:, 0], P[:, 1])
+    except (RuntimeError, ValueError):
+        D = None
+    if D is None or P.shape[0] < 3:
+        # all sites on a line
+        S, sites = collinear_edges(P, box, return_sites=True)
+        return S.reshape(-1, 4), sites
+    S, sites = dual_block(P, D.triangles, D.neighbors, 0, D.triangles.shape[0], box)
+    S, keep = clip_box(S, box)
+    return S, sites[keep]
+
+
+def run_chunk(P, offsets, boxes, groups=None):
+    # the diagrams in groups (all by default), the edges of the triangulated ones built together;
+    # returns edges, sites in the indices of P and the diagram of every edge
+    if groups is None:
+        groups = range(len(offsets) - 1)
+    T, tg, rest = triangulate_groups(P, offsets, groups)
+    S, sites, owner = dual_rows(P, T, neighbors(T, P.shape[0]), boxes, tg)
+    S, sites, owner = [S], [sites], [owner]
+    for g in rest:
+        s, pair = single(P[offsets[g]:offsets[g + 1]], boxes[g])
+        S.append(s)
+        sites.append(pair + offsets[g])
+        owner.append(np.full(s.shape[0], g, dtype=np.int64))
+    return np.concatenate(S), np.concatenate(sites), np.concatenate(owner)
+
+
+def voronoi_batch(P, offsets, boxes=None, workers=1, chunk=1024, return_sites=False):
+    # many small diagrams in one call: diagram g has the sites P[offsets[g]:offsets[g + 1]] and is
+    # clipped to boxes[g] (default_bbox of its sites, or one box for all); returns the (E, 2, 2)
+    # edges of all diagrams, every edge once, diagram g in edges[edge_offsets[g]:edge_offsets[g + 1]],
+    # and with return_sites the two sites of every edge as indices within its diagram. Only the
+    # triangulation runs per diagram, neighbours, circumcircles, edges and clipping run on chunk
+    # diagrams at a time, the chunks go to workers processes
+    P = np.asarray(P, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    k = len(offsets) - 1
+    if boxes is None:
+        boxes = default_boxes(P, offsets)
+    boxes = np.broadcast_to(np.asarray(boxes, dtype=float), (k, 4))
+
+    parts = []
+    if workers > 1 and k > chunk:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            futures = []
+            for c in range(0, k, chunk):
+                groups = np.arange(c, min(c + chunk, k))
+                lo, hi = offsets[groups[0]], offsets[groups[-1] + 1]
+                futures.append((groups, lo, pool.submit(run_chunk, P[lo:hi], offsets[c:groups[-1] + 2] - lo, boxes[groups])))
+            for groups, lo, future in futures:
+                S, sites, owner = future.result()
+                parts.append((S, sites + lo, groups[owner]))
+    else:
+        parts = [run_chunk(P, offsets, boxes, range(c, min(c + chunk, k))) for c in range(0, k, chunk)]
+
+    S = np.concatenate([np.empty((0, 4))] + [p[0] for p in parts])
+    sites = np.concatenate([np.empty((0, 2), dtype=np.int64)] + [p[1] for p in parts])
+    owner = np.concatenate([np.empty(0, dtype=np.int64)] + [p[2] for p in parts])
+    order = np.argsort(owner, kind='stable')
+    S, sites, owner = S[order], sites[order], owner[order]
+    edge_offsets = np.zeros(k + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner, minlength=k), out=edge_offsets[1:])
+    if return_sites:
+        return S.reshape(-1, 2, 2), edge_offsets, sites - offsets[owner][:, None]
+    return S.reshape(-1, 2, 2), edge_offsets
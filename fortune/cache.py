@@ -0,0 +1,91 @@
+import collections
+import os
+import tempfile
+
+import numpy as np
+
+from fortune import engines
+
+
+class DiagramCache:
+    # engine results keyed by engines.digest, an LRU in memory bounded by max_bytes
+    # and, when directory is given, a second tier of .npy files on disk
+    def __init__(self, max_bytes=256 << 20, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+        if self.directory is not None:
+            try:
+                value = np.load(self._path(key))
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                self._remember(key, value)
+                return value
+        self.misses += 1
+
+    def put(self, key, value):
+        value = np.asarray(value)
+        self._remember(key, value)
+        if self.directory is not None and not os.path.exists(self._path(key)):
+            # write then rename, readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, value)
+            os.replace(tmp, self._path(key))
+        return value
+
+    def _remember(self, key, value):
+        # cached arrays are shared between callers, so they are read-only
+        value.flags.writeable = False
+        if key in self._items:
+            self.nbytes -= self._items.pop(key).nbytes
+        if value.nbytes > self.max_bytes:
+            return
+        self._items[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, old = self._items.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+    def compute(self, engine, points, **options):
+        points = np.asarray(points, dtype=float)
+        key = engines.digest(engine, points, options)
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, engines.run(engine, points, **options))
+        return value
+
+
+default_cache = DiagramCache()
+
+
+def cached(engine, points, **options):
+    return default_cache.compute(engine, points, **options)
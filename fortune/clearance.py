@@ -0,0 +1,32 @@
+import numpy as np
+
+from fortune.fortune2 import triangulate
+from fortune.polygon import PolygonIndex
+
+
+def vertex_clearance(P):
+    # every Voronoi vertex (one per Delaunay triangle, from circumcircle2) and the
+    # distance to its nearest sites, i.e. the radius of its empty circle
+    P = np.asarray(P, dtype=float)
+    T, _, C = triangulate(P)
+    r = np.hypot(C[:, 0] - P[T[:, 0], 0], C[:, 1] - P[T[:, 0], 1])
+    return C, r, T
+
+
+def largest_empty_circles(P, k=10, bbox=None, polygon=None):
+    # the k Voronoi vertices with the largest clearance whose center lies in bbox
+    # (xmin, ymin, xmax, ymax) and/or polygon (rings or a PolygonIndex)
+    C, r, T = vertex_clearance(P)
+    keep = np.isfinite(r)
+    if bbox is not None:
+        keep &= (C[:, 0] >= bbox[0]) & (C[:, 1] >= bbox[1]) & (C[:, 0] <= bbox[2]) & (C[:, 1] <= bbox[3])
+    if polygon is not None:
+        if not isinstance(polygon, PolygonIndex):
+            polygon = PolygonIndex(polygon)
+        idx = np.flatnonzero(keep)
+        keep[idx] = polygon.contains(C[idx])
+    idx = np.flatnonzero(keep)
+    if k < idx.size:
+        idx = idx[np.argpartition(-r[idx], k)[:k]]
+    idx = idx[np.argsort(-r[idx])]
+    return C[idx], r[idx], T[idx]
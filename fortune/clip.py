@@ -0,0 +1,136 @@
+import matplotlib.tri
+import numpy as np
+
+from fortune.adjacency import triangles_adjacency
+from fortune.fortune2 import clip_box, dual_block, triangulate
+from fortune.polygon import PolygonIndex
+from fortune.viewport import bucket, cover
+
+
+def cross(a, b):
+    return a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+
+
+class EdgeGrid:
+    # boundary edges of a PolygonIndex registered in a uniform grid over its bounding box
+    def __init__(self, index, size=None):
+        E = index.edges
+        self.edges = E
+        self.size = size or max(1, int(np.ceil(np.sqrt(E.shape[0]))))
+        self.origin = np.array((index.xmin, index.ymin))
+        self.cell = np.maximum(np.array((index.xmax - index.xmin, index.ymax - index.ymin)) / self.size, 1e-300)
+        lo = self.locate(np.minimum(E[:, :2], E[:, 2:]))
+        hi = self.locate(np.maximum(E[:, :2], E[:, 2:]))
+        self.shape = (self.size, self.size)
+        self.cell_ptr, self.cell_edges = bucket(lo, hi, self.shape)
+
+    def locate(self, X):
+        return np.clip(((X - self.origin) / self.cell).astype(np.int64), 0, self.size - 1)
+
+    def candidates(self, S):
+        # unique (segment, boundary edge) pairs sharing a grid cell
+        lo = self.locate(np.minimum(S[:, :2], S[:, 2:]))
+        hi = self.locate(np.maximum(S[:, :2], S[:, 2:]))
+        seg, cells = cover(lo, hi, self.shape)
+        count = self.cell_ptr[cells + 1] - self.cell_ptr[cells]
+        pair = np.repeat(np.arange(seg.size), count)
+        r = np.arange(pair.size) - (np.cumsum(count) - count)[pair]
+        edge = self.cell_edges[self.cell_ptr[cells][pair] + r]
+        key = np.unique(seg[pair] * self.edges.shape[0] + edge)
+        return key // self.edges.shape[0], key % self.edges.shape[0]
+
+
+def intersections(S, grid):
+    # segment / boundary crossings as (segment, t, edge, u) with both parameters in [0, 1]
+    s, e = grid.candidates(S)
+    p, r = S[s, :2], S[s, 2:] - S[s, :2]
+    q, d = grid.edges[e, :2], grid.edges[e, 2:] - grid.edges[e, :2]
+    den = cross(r, d)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = cross(q - p, d) / den
+        u = cross(q - p, r) / den
+    ok = (den != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    return s[ok], t[ok], e[ok], u[ok]
+
+
+def split(S, item, t):
+    # cut the rows of S at the parameters t given for item, returns the pieces and their row
+    n = S.shape[0]
+    item = np.concatenate((np.arange(n), np.arange(n), item))
+    t = np.concatenate((np.zeros(n), np.ones(n), t))
+    order = np.lexsort((t, item))
+    item, t = item[order], t[order]
+    same = item[1:] == item[:-1]
+    row, ta, tb = item[:-1][same], t[:-1][same], t[1:][same]
+    x0, y0 = S[row, 0], S[row, 1]
+    dx, dy = S[row, 2] - x0, S[row, 3] - y0
+    pieces = np.column_stack((x0 + ta * dx, y0 + ta * dy, x0 + tb * dx, y0 + tb * dy))
+    return pieces, row
+
+
+def nearest_sites(P, indptr, indices, X, start, weights=None):
+    # greedy walk on the Delaunay graph, it only stops at the nearest site
+    # (smallest power distance |x - p|^2 - w with weights, on the regular triangulation)
+    w = np.zeros(P.shape[0]) if weights is None else np.asarray(weights, dtype=float)
+    current = start.copy()
+    best = np.square(P[current] - X).sum(axis=1) - w[current]
+    active = np.arange(X.shape[0])
+    while active.size:
+        v = current[active]
+        count = indptr[v + 1] - indptr[v]
+        query = np.repeat(np.arange(active.size), count)
+        nb = indices[indptr[v][query] + np.arange(query.size) - (np.cumsum(count) - count)[query]]
+        d = np.square(P[nb] - X[active[query]]).sum(axis=1) - w[nb]
+        order = np.lexsort((d, query))
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = query[order][1:] != query[order][:-1]
+        q, nb, d = query[order][first], nb[order][first], d[order][first]
+        better = d < best[active[q]]
+        moved = active[q[better]]
+        current[moved] = nb[better]
+        best[moved] = d[better]
+        active = moved
+    return current
+
+
+def clip_to_polygon(P, polygon, weights=None):
+    # the diagram clipped to a polygon (rings with holes, or a PolygonIndex): the pieces of
+    # Voronoi edges inside it, with their two sites, then the pieces of the domain boundary
+    # between them, with their site and -1
+    P = np.asarray(P, dtype=float)
+    index = polygon if isinstance(polygon, PolygonIndex) else PolygonIndex(polygon)
+    grid = EdgeGrid(index)
+    bbox = (index.xmin, index.ymin, index.xmax, index.ymax)
+    T, N, _ = triangulate(P, weights)
+    S, sites = dual_block(P, T, N, 0, T.shape[0], bbox, weights)
+    S, keep = clip_box(S, bbox)
+    sites = sites[keep]
+
+    s, t, e, u = intersections(S, grid)
+    pieces, row = split(S, s, t)
+    mid = 0.5 * (pieces[:, :2] + pieces[:, 2:])
+    inside = index.contains(mid)
+    segments, segment_sites = pieces[inside], sites[row[inside]]
+
+    boundary, _ = split(grid.edges, e, u)
+    mid = 0.5 * (boundary[:, :2] + boundary[:, 2:])
+    tri = matplotlib.tri.Triangulation(P[:, 0], P[:, 1], T).get_trifinder()(mid[:, 0], mid[:, 1])
+    start = np.where(tri >= 0, T[np.maximum(tri, 0), 0], T[0, 0])
+    indptr, indices = triangles_adjacency(T, P.shape[0], as_matrix=False)
+    owner = nearest_sites(P, indptr, indices, mid, start, weights)
+    boundary_sites = np.column_stack((owner, np.full(owner.size, -1)))
+
+    segments = np.concatenate((segments, boundary)).reshape(-1, 2, 2)
+    return segments, np.concatenate((segment_sites, boundary_sites))
+
+
+def cell_edges(sites, n):
+    # CSR (indptr, segment ids) of the segments bounding each site's clipped cell
+    seg = np.repeat(np.arange(sites.shape[0]), 2)
+    site = sites.ravel()
+    ok = site >= 0
+    seg, site = seg[ok], site[ok]
+    order = np.argsort(site, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(site, minlength=n), out=indptr[1:])
+    return indptr, seg[order]
@@ -0,0 +1,59 @@
+import hashlib
+
+import numpy as np
+
+from fortune import fortune1, fortune2, incremental
+from fortune.Voronoi import Voronoi
+from fortune.snap import snap
+
+
+def fortune_sweep(points):
+    v = Voronoi(points)
+    v.process()
+    v.finish_edges()
+    return np.array(v.get_output(), dtype=float).reshape(-1, 2, 2)
+
+
+def delaunay_dual(points):
+    return np.array(fortune1.voronoi(points[:, 0], points[:, 1]), dtype=float).reshape(-1, 2, 2)
+
+
+def clipped_dual(points, bbox=None, weights=None):
+    return np.array(fortune2.voronoi2(points, bbox, weights), dtype=float).reshape(-1, 2, 2)
+
+
+def incremental_dual(points, bbox=None, seed=None):
+    return np.array(incremental.voronoi_incremental(points, bbox, seed=seed), dtype=float).reshape(-1, 2, 2)
+
+
+# every engine takes an (n, 2) float array and returns (E, 2, 2) segments
+ENGINES = {
+    'fortune': fortune_sweep,
+    'fortune1': delaunay_dual,
+    'voronoi2': clipped_dual,
+    'incremental': incremental_dual,
+}
+
+
+def run(engine, points, tol=None, **options):
+    # tol merges duplicate and near duplicate sites first, see fortune.snap
+    points = np.asarray(points, dtype=float)
+    if tol is not None:
+        points, _ = snap(points, tol)
+    return ENGINES[engine](points, **options)
+
+
+def digest(engine, points, options):
+    # content key of a request: engine, raw site bytes and options
+    points = np.ascontiguousarray(points, dtype=float)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(engine.encode())
+    h.update(str(points.shape).encode())
+    h.update(points.data)
+    for name in sorted(options):
+        value = options[name]
+        if isinstance(value, (list, tuple, np.ndarray)):
+            value = np.asarray(value, dtype=float)
+            value = (value.shape, value.tobytes())
+        h.update(repr((name, value)).encode())
+    return h.hexdigest()
@@ -2,6 +2,8 @@ import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
+from fortune.adjacency import triangles_adjacency
+
 
 def circumcircle(P1, P2, P3):
     '''
@@ -23,13 +25,18 @@ def circumcircle(P1, P2, P3):
     return center_x, center_y
 
 
-def voronoi(X, Y):
+def bounded_points(X, Y):
     P = np.zeros((X.size + 4, 2))
     P[:X.size, 0], P[:Y.size, 1] = X, Y
     # We add four points at "infinity"
     m = max(np.abs(X).max(), np.abs(Y).max()) * 1e5
     P[X.size:, 0] = -m, -m, +m, +m
     P[Y.size:, 1] = -m, +m, -m, +m
+    return P
+
+
+def voronoi(X, Y):
+    P = bounded_points(X, Y)
     D = matplotlib.tri.Triangulation(P[:, 0], P[:, 1])
     T = D.triangles
     n = T.shape[0]
@@ -46,6 +53,13 @@ def voronoi(X, Y):
     return segments
 
 
+def adjacency(X, Y, as_matrix=True):
+    # the real sites only, the points at "infinity" of voronoi cost qhull the precision
+    # it needs for the in-circle tests and flip edges
+    D = matplotlib.tri.Triangulation(X, Y)
+    return triangles_adjacency(D.triangles, X.size, as_matrix)
+
+
 if __name__ == '__main__':
     X = np.random.random(10)
     Y = np.random.random(10)
@@ -1,20 +1,54 @@
+import concurrent.futures
 import sys
 
 import matplotlib.pyplot as plt
 import matplotlib.tri
 import numpy as np
 
+try:
+    from scipy.spatial import ConvexHull
+except ImportError:
+    ConvexHull = None
 
-def circumcircle2(T):
+from fortune.adjacency import triangles_adjacency
+
+
+def circumcircle2(T, W=None):
     P1, P2, P3 = T[:, 0], T[:, 1], T[:, 2]
     b = P2 - P1
     c = P3 - P1
     d = 2 * (b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0])
-    center_x = (c[:, 1] * (np.square(b[:, 0]) + np.square(b[:, 1])) - b[:, 1] * (np.square(c[:, 0]) + np.square(c[:, 1]))) / d + P1[:, 0]
-    center_y = (b[:, 0] * (np.square(c[:, 0]) + np.square(c[:, 1])) - c[:, 0] * (np.square(b[:, 0]) + np.square(b[:, 1]))) / d + P1[:, 1]
+    sb = np.square(b[:, 0]) + np.square(b[:, 1])
+    sc = np.square(c[:, 0]) + np.square(c[:, 1])
+    if W is not None:
+        # power center: same power distance |x - p|^2 - w to the three sites
+        sb = sb - (W[:, 1] - W[:, 0])
+        sc = sc - (W[:, 2] - W[:, 0])
+    center_x = (c[:, 1] * sb - b[:, 1] * sc) / d + P1[:, 0]
+    center_y = (b[:, 0] * sc - c[:, 0] * sb) / d + P1[:, 1]
     return np.array((center_x, center_y)).T
 
 
+def regular_triangulation(P, weights):
+    # weighted Delaunay: lower convex hull of the sites lifted to x^2 + y^2 - w
+    if ConvexHull is None:
+        raise ImportError('power diagrams need scipy.spatial.ConvexHull')
+    hull = ConvexHull(np.column_stack((P, np.square(P).sum(axis=1) - weights)))
+    lower = hull.equations[:, 2] < -1e-12
+    T = hull.simplices[lower]
+    index = np.full(lower.size, -1)
+    index[lower] = np.arange(T.shape[0])
+    N = index[hull.neighbors[lower]]
+    # counter-clockwise triangles, as matplotlib.tri returns them
+    b = P[T[:, 1]] - P[T[:, 0]]
+    c = P[T[:, 2]] - P[T[:, 0]]
+    cw = b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0] < 0
+    T[cw] = T[cw][:, ::-1]
+    N[cw] = N[cw][:, ::-1]
+    # scipy gives the neighbour opposite vertex j, matplotlib the one across edge (j, j + 1)
+    return T, np.roll(N, 1, axis=1)
+
+
 def check_outside(point, bbox):
     point = np.round(point, 4)
     return point[0] < bbox[0] or point[0] > bbox[2] or point[1] < bbox[1] or point[1] > bbox[3]
@@ -23,7 +57,7 @@ def check_outside(point, bbox):
 def move_point(start, end, bbox):
     vector = end - start
     c = calc_shift(start, vector, bbox)
-    if 0 < c < 1:
+    if c is not None and 0 < c < 1:
         start = start + c * vector
         return start
 
@@ -38,26 +72,36 @@ def calc_shift(point, vector, bbox):
     return c if c < sys.float_info.max else None
 
 
-def voronoi2(P, bbox=None):
-    if not isinstance(P, np.ndarray):
-        P = np.array(P)
-    if not bbox:
-        xmin = P[:, 0].min()
-        xmax = P[:, 0].max()
-        ymin = P[:, 1].min()
-        ymax = P[:, 1].max()
-        xrange = (xmax - xmin) * 0.3333333
-        yrange = (ymax - ymin) * 0.3333333
-        bbox = (xmin - xrange, ymin - yrange, xmax + xrange, ymax + yrange)
-    bbox = np.round(bbox, 4)
-    D = matplotlib.tri.Triangulation(P[:, 0], P[:, 1])
-    T = D.triangles
+def default_bbox(P):
+    xmin = P[:, 0].min()
+    xmax = P[:, 0].max()
+    ymin = P[:, 1].min()
+    ymax = P[:, 1].max()
+    xrange = (xmax - xmin) * 0.3333333
+    yrange = (ymax - ymin) * 0.3333333
+    return xmin - xrange, ymin - yrange, xmax + xrange, ymax + yrange
+
+
+def triangulate(P, weights=None):
+    if weights is None:
+        D = matplotlib.tri.Triangulation(P[:, 0], P[:, 1])
+        T, N = D.triangles, D.neighbors
+        C = circumcircle2(P[T])
+    else:
+        # power diagram, weights are squared radii
+        weights = np.asarray(weights, dtype=float)
+        T, N = regular_triangulation(P, weights)
+        C = circumcircle2(P[T], weights[T])
+    return T, N, C
+
+
+def clip_segments(P, T, N, C, bbox):
     n = T.shape[0]
-    C = circumcircle2(P[T])
     segments = []
+    sites = []
     for i in range(n):
         for j in range(3):
-            k = D.neighbors[i][j]
+            k = N[i][j]
             if k != -1:
                 # cut segment to part in bbox
                 start, end = C[i], C[k]
@@ -70,6 +114,7 @@ def voronoi2(P, bbox=None):
                     if end is None:
                         continue
                 segments.append([start, end])
+                sites.append((T[i, j], T[i, (j + 1) % 3]))
             else:
                 # ignore center outside of bbox
                 if check_outside(C[i], bbox):
@@ -84,9 +129,156 @@ def voronoi2(P, bbox=None):
                 c = calc_shift(C[i], vector, bbox)
                 if c is not None:
                     segments.append([C[i], C[i] + c * vector])
+                    sites.append((T[i, j], T[i, (j + 1) % 3]))
+    # the two sites separated by each segment
+    return segments, np.array(sites, dtype=np.int64).reshape(-1, 2)
+
+
+def clip_box(S, bbox):
+    # Liang-Barsky against (xmin, ymin, xmax, ymax), or one such box per row as (E, 4), returns
+    # the clipped rows and which survived
+    return clip_rays(S[:, :2], S[:, 2:] - S[:, :2], (0.0, 1.0), bbox)
+
+
+def clip_rays(origin, direction, bounds, bbox):
+    # the parts of origin + t * direction, t in bounds (a pair or (E, 2), infinite for rays and
+    # lines), inside bbox (one box or (E, 4)) as (E, 4) rows, and which rows survived
+    bbox = np.asarray(bbox, dtype=float).T
+    x0, y0 = origin[:, 0], origin[:, 1]
+    dx, dy = direction[:, 0], direction[:, 1]
+    bounds = np.broadcast_to(np.asarray(bounds, dtype=float), (origin.shape[0], 2))
+    t0 = bounds[:, 0].copy()
+    t1 = bounds[:, 1].copy()
+    keep = np.ones(origin.shape[0], dtype=bool)
+    for p, q in ((-dx, x0 - bbox[0]), (dx, bbox[2] - x0), (-dy, y0 - bbox[1]), (dy, bbox[3] - y0)):
+        parallel = p == 0
+        keep &= ~(parallel & (q < 0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = q / p
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+    keep &= t0 <= t1
+    with np.errstate(invalid='ignore'):
+        S = np.column_stack((x0 + t0 * dx, y0 + t0 * dy, x0 + t1 * dx, y0 + t1 * dy))
+    return S[keep], keep
+
+
+def dual_block(P, T, N, start, stop, bbox, weights=None):
+    # Voronoi edges of the triangles start..stop as (E, 4) rows with their two sites, each edge
+    # once: towards the higher numbered neighbour, or a ray out of the hull reaching past bbox
+    # (one box, or one per triangle start..stop as (stop - start, 4))
+    t, nb = T[start:stop], N[start:stop]
+    i, j = np.nonzero((nb > np.arange(start, stop)[:, None]) | (nb < 0))
+    k = nb[i, j]
+    W = None if weights is None else weights[t]
+    center = circumcircle2(P[t], W)[i]
+    end = np.empty_like(center)
+    inner = k >= 0
+    end[inner] = circumcircle2(P[T[k[inner]]], None if weights is None else weights[T[k[inner]]])
+    a, b = t[i, j], t[i, (j + 1) % 3]
+    # triangles are counter-clockwise, the outward normal of edge (a, b) points to its right
+    ray = ~inner
+    d = P[b[ray]] - P[a[ray]]
+    normal = np.column_stack((d[:, 1], -d[:, 0])) / np.hypot(d[:, 0], d[:, 1])[:, None]
+    box = np.asarray(bbox, dtype=float)
+    if box.ndim == 2:
+        box = box[i[ray]].T
+    middle = (0.5 * (box[0] + box[2]), 0.5 * (box[1] + box[3]))
+    reach = np.hypot(center[ray, 0] - middle[0], center[ray, 1] - middle[1]) + np.hypot(box[2] - box[0], box[3] - box[1])
+    end[ray] = center[ray] + reach[:, None] * normal
+    return np.column_stack((center, end)), np.column_stack((a, b))
+
+
+def collinear_edges(P, bbox, return_sites=False):
+    # all sites on one line: the cells are slabs between the bisectors of consecutive sites
+    d = P[-1] - P[0] if P.shape[0] > 1 else np.array((1.0, 0.0))
+    order = np.argsort(P @ d, kind='stable')
+    Q = P[order]
+    mid = 0.5 * (Q[1:] + Q[:-1])
+    normal = np.column_stack((-d[1], d[0])) / max(np.hypot(d[0], d[1]), 1e-300)
+    reach = np.hypot(bbox[2] - bbox[0], bbox[3] - bbox[1]) + np.abs(mid - (0.5 * (bbox[0] + bbox[2]), 0.5 * (bbox[1] + bbox[3]))).sum(axis=1)
+    S = np.column_stack((mid - reach[:, None] * normal, mid + reach[:, None] * normal))
+    S, keep = clip_box(S, bbox)
+    if return_sites:
+        return S.reshape(-1, 2, 2), np.column_stack((order[:-1], order[1:]))[keep]
+    return S.reshape(-1, 2, 2)
+
+
+def voronoi2_chunked(P, bbox=None, weights=None, block=1 << 16, return_sites=False, workers=1):
+    # voronoi2 with the triangles streamed in blocks through circumcircle2 and clip_box into
+    # preallocated (E, 2, 2) output, every edge once, no full size temporaries
+    P = np.asarray(P, dtype=float)
+    if bbox is None:
+        bbox = default_bbox(P)
+    if weights is None:
+        D = matplotlib.tri.Triangulation(P[:, 0], P[:, 1])
+        T, N = D.triangles, D.neighbors
+    else:
+        weights = np.asarray(weights, dtype=float)
+        T, N = regular_triangulation(P, weights)
+    return dual_edges(P, T, N, bbox, weights, block, return_sites, workers)
+
+
+def dual_edges(P, T, N, bbox, weights=None, block=1 << 16, return_sites=False, workers=1):
+    # clipped Voronoi edges of any triangulation (T, N), blocks of triangles go to a pool of
+    # workers threads, each writing its own slice of the output, which is compacted at the end
+    m = T.shape[0]
+    starts = list(range(0, m, block))
+    offset = [0]
+    for start in starts:
+        nb = N[start:start + block]
+        offset.append(offset[-1] + np.count_nonzero((nb > np.arange(start, start + nb.shape[0])[:, None]) | (nb < 0)))
+    out = np.empty((offset[-1], 2, 2))
+    sites = np.empty((offset[-1], 2), dtype=np.int64) if return_sites else None
+
+    def work(b):
+        start = starts[b]
+        S, pair = dual_block(P, T, N, start, min(start + block, m), bbox, weights)
+        S, keep = clip_box(S, bbox)
+        out[offset[b]:offset[b] + S.shape[0]] = S.reshape(-1, 2, 2)
+        if return_sites:
+            sites[offset[b]:offset[b] + S.shape[0]] = pair[keep]
+        return S.shape[0]
+
+    if workers > 1 and len(starts) > 1:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            kept = list(pool.map(work, range(len(starts))))
+    else:
+        kept = [work(b) for b in range(len(starts))]
+    pos = 0
+    for b, k in enumerate(kept):
+        out[pos:pos + k] = out[offset[b]:offset[b] + k]
+        if return_sites:
+            sites[pos:pos + k] = sites[offset[b]:offset[b] + k]
+        pos += k
+    if return_sites:
+        return out[:pos], sites[:pos]
+    return out[:pos]
+
+
+def voronoi2(P, bbox=None, weights=None, return_sites=False):
+    if not isinstance(P, np.ndarray):
+        P = np.array(P)
+    if not bbox:
+        bbox = default_bbox(P)
+    bbox = np.round(bbox, 4)
+    T, N, C = triangulate(P, weights)
+    segments, sites = clip_segments(P, T, N, C, bbox)
+    if return_sites:
+        return segments, sites
     return segments
 
 
+def adjacency2(P, as_matrix=True, weights=None):
+    if not isinstance(P, np.ndarray):
+        P = np.array(P)
+    if weights is None:
+        T = matplotlib.tri.Triangulation(P[:, 0], P[:, 1]).triangles
+    else:
+        T, _ = regular_triangulation(P, np.asarray(weights, dtype=float))
+    return triangles_adjacency(T, P.shape[0], as_matrix)
+
+
 if __name__ == '__main__':
     points = np.random.rand(10, 2) * 100
     lines = voronoi2(points, (-20, -20, 120, 120))
@@ -0,0 +1,163 @@
+import random
+
+import numpy as np
+
+from fortune.fortune2 import circumcircle2, clip_segments, default_bbox
+
+
+def hilbert_index(P, order=16):
+    # position of every site along a Hilbert curve over the bounding box of P
+    side = (1 << order) - 1
+    lo = P.min(axis=0)
+    span = max((P.max(axis=0) - lo).max(), 1e-300)
+    x = ((P[:, 0] - lo[0]) / span * side).astype(np.int64)
+    y = ((P[:, 1] - lo[1]) / span * side).astype(np.int64)
+    d = np.zeros(P.shape[0], dtype=np.int64)
+    s = 1 << (order - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant
+        flip = ~ry & rx
+        x = np.where(flip, side - x, x)
+        y = np.where(flip, side - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return d
+
+
+def brio_order(P, seed=None):
+    # biased randomized insertion order: rounds of doubling size drawn at random,
+    # each round sorted along the Hilbert curve
+    rank = np.random.RandomState(seed).permutation(P.shape[0])
+    rounds = np.floor(np.log2(rank + 1)).astype(np.int64)
+    return np.lexsort((hilbert_index(P), rounds))
+
+
+class Triangulation:
+    # incremental Delaunay triangulation (Bowyer-Watson) inside a large super triangle,
+    # points are located by walking from the last inserted triangle; triangles are
+    # counter-clockwise and neighbour j is across the edge (v[j], v[j + 1]) as in matplotlib.tri
+    def __init__(self, P, seed=None):
+        P = np.asarray(P, dtype=float)
+        self.n = P.shape[0]
+        lo, hi = P.min(axis=0), P.max(axis=0)
+        c = (lo + hi) / 2.0
+        r = max((hi - lo).max(), 1.0) * 1e4
+        self.X = P[:, 0].tolist() + [c[0] - 2 * r, c[0] + 2 * r, c[0]]
+        self.Y = P[:, 1].tolist() + [c[1] - r, c[1] - r, c[1] + 2 * r]
+        n = self.n
+        self.V = [[n, n + 1, n + 2]]
+        self.N = [[-1, -1, -1]]
+        self.free = []
+        self.last = 0
+        self.duplicate = {}  # site index -> the equal site it was merged into
+        self.random = random.Random(seed)
+        for i in brio_order(P, seed).tolist():
+            self.insert(i)
+
+    def orient(self, a, b, p):
+        X, Y = self.X, self.Y
+        return (X[b] - X[a]) * (Y[p] - Y[a]) - (Y[b] - Y[a]) * (X[p] - X[a])
+
+    def incircle(self, t, p):
+        X, Y = self.X, self.Y
+        a, b, c = self.V[t]
+        px, py = X[p], Y[p]
+        adx, ady = X[a] - px, Y[a] - py
+        bdx, bdy = X[b] - px, Y[b] - py
+        cdx, cdy = X[c] - px, Y[c] - py
+        return ((adx * adx + ady * ady) * (bdx * cdy - cdx * bdy) +
+                (bdx * bdx + bdy * bdy) * (cdx * ady - adx * cdy) +
+                (cdx * cdx + cdy * cdy) * (adx * bdy - bdx * ady)) > 0
+
+    def locate(self, p):
+        # remembering stochastic walk
+        t = self.last
+        previous = -1
+        while True:
+            v = self.V[t]
+            k = self.random.randrange(3)
+            for j in (k, (k + 1) % 3, (k + 2) % 3):
+                u = self.N[t][j]
+                if u != previous and u != -1 and self.orient(v[j], v[(j + 1) % 3], p) < 0:
+                    previous, t = t, u
+                    break
+            else:
+                return t
+
+    def insert(self, p):
+        t = self.locate(p)
+        for v in self.V[t]:
+            if self.X[v] == self.X[p] and self.Y[v] == self.Y[p]:
+                self.duplicate[p] = v
+                return
+        # cavity of the triangles whose circumcircle contains p, and its boundary
+        cavity = {t}
+        stack = [t]
+        boundary = []
+        while stack:
+            s = stack.pop()
+            v = self.V[s]
+            for j in range(3):
+                u = self.N[s][j]
+                if u in cavity:
+                    continue
+                if u != -1 and self.incircle(u, p):
+                    cavity.add(u)
+                    stack.append(u)
+                else:
+                    boundary.append((v[j], v[(j + 1) % 3], u))
+        slots = list(cavity)
+        self.free.extend(slots)
+        starting, ending = {}, {}
+        for a, b, u in boundary:
+            s = self.free.pop() if self.free else self.new_slot()
+            self.V[s] = [a, b, p]
+            self.N[s] = [u, -1, -1]
+            starting[a] = s
+            ending[b] = s
+            if u != -1:
+                w = self.V[u]
+                for j in range(3):
+                    if w[j] == b and w[(j + 1) % 3] == a:
+                        self.N[u][j] = s
+                        break
+        for a, b, u in boundary:
+            s = starting[a]
+            self.N[s][1] = starting[b]
+            self.N[s][2] = ending[a]
+        self.last = s
+
+    def new_slot(self):
+        self.V.append(None)
+        self.N.append(None)
+        return len(self.V) - 1
+
+    def arrays(self):
+        # (T, 3) triangles and neighbours without the super triangle, slots freed but not reused dropped
+        free = set(self.free)
+        alive = [s for s in range(len(self.V)) if s not in free]
+        V = np.array([self.V[s] for s in alive], dtype=np.int64).reshape(-1, 3)
+        N = np.array([self.N[s] for s in alive], dtype=np.int64).reshape(-1, 3)
+        keep = (V < self.n).all(axis=1)
+        index = np.full(len(self.V), -1, dtype=np.int64)
+        index[np.array(alive, dtype=np.int64)[keep]] = np.arange(keep.sum())
+        N = N[keep]
+        N = np.where(N >= 0, index[np.maximum(N, 0)], -1)
+        return V[keep], N
+
+
+def voronoi_incremental(P, bbox=None, return_sites=False, seed=None):
+    # same output as fortune2.voronoi2, from the incremental triangulation
+    P = np.asarray(P, dtype=float)
+    if not bbox:
+        bbox = default_bbox(P)
+    bbox = np.round(bbox, 4)
+    T, N = Triangulation(P, seed).arrays()
+    segments, sites = clip_segments(P, T, N, circumcircle2(P[T]), bbox)
+    if return_sites:
+        return segments, sites
+    return segments
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib.tri
+import numpy as np
+
+from fortune.fortune2 import circumcircle2
+
+
+def signed_area(a, b, c):
+    return 0.5 * ((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]))
+
+
+class NaturalNeighbor:
+    # Sibson interpolation of values given at the sites P, evaluated for many queries at once.
+    # The area a query steals from site a is summed over the triangles t = (a, b, c) whose
+    # circumcircle contains it, as the signed area of (g(q, a, b), center(t), g(q, c, a)),
+    # g being the circumcenters with the query (Watson's formulation).
+    def __init__(self, P, values):
+        self.P = np.asarray(P, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self.tri = matplotlib.tri.Triangulation(self.P[:, 0], self.P[:, 1])
+        self.T = self.tri.triangles
+        self.N = self.tri.neighbors
+        self.C = circumcircle2(self.P[self.T])
+        self.R2 = np.square(self.C - self.P[self.T[:, 0]]).sum(axis=1)
+        self.finder = self.tri.get_trifinder()
+
+    def cavity(self, Q):
+        # (query, triangle) pairs whose circumcircle contains the query, by breadth first search
+        start = self.finder(Q[:, 0], Q[:, 1])
+        q = np.flatnonzero(start >= 0)
+        t = start[q]
+        m = self.T.shape[0]
+        # neighbours of a BFS level lie in the previous, the same or the next level only
+        before, level = np.zeros(0, dtype=np.int64), q * m + t
+        found_q, found_t = [q], [t]
+        while q.size:
+            q = np.repeat(q, 3)
+            t = self.N[np.repeat(t, 3), np.tile(np.arange(3), t.size)]
+            ok = t >= 0
+            q, t = q[ok], t[ok]
+            inside = np.square(Q[q] - self.C[t]).sum(axis=1) < self.R2[t]
+            q, t = q[inside], t[inside]
+            key, first = np.unique(q * m + t, return_index=True)
+            new = ~np.isin(key, np.concatenate((before, level)))
+            q, t = q[first[new]], t[first[new]]
+            before, level = level, key[new]
+            found_q.append(q)
+            found_t.append(t)
+        return np.concatenate(found_q), np.concatenate(found_t), start
+
+    def evaluate(self, Q):
+        Q = np.asarray(Q, dtype=float).reshape(-1, 2)
+        q, t, start = self.cavity(Q)
+        x = Q[q]
+        a, b, c = self.P[self.T[t, 0]], self.P[self.T[t, 1]], self.P[self.T[t, 2]]
+        ct = self.C[t]
+        # a query on a site makes degenerate circles, its value is set below
+        with np.errstate(invalid='ignore', divide='ignore'):
+            g_ab = circumcircle2(np.stack((x, a, b), axis=1))
+            g_bc = circumcircle2(np.stack((x, b, c), axis=1))
+            g_ca = circumcircle2(np.stack((x, c, a), axis=1))
+        stolen = (signed_area(g_ab, ct, g_ca), signed_area(g_bc, ct, g_ab), signed_area(g_ca, ct, g_bc))
+        values = self.values.reshape(self.P.shape[0], -1)
+        den = np.zeros(Q.shape[0])
+        num = np.zeros((Q.shape[0], values.shape[1]))
+        for j in range(3):
+            den += np.bincount(q, stolen[j], minlength=Q.shape[0])
+            f = values[self.T[t, j]]
+            for k in range(values.shape[1]):
+                num[:, k] += np.bincount(q, stolen[j] * f[:, k], minlength=Q.shape[0])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = num / den[:, None]
+        # outside the convex hull Sibson coordinates are unbounded
+        result[start < 0] = np.nan
+        # a query on a site takes the site value
+        corner = self.P[self.T[np.maximum(start, 0)]]
+        hit = (np.square(corner - Q[:, None, :]).sum(axis=2) == 0) & (start >= 0)[:, None]
+        rows, cols = np.nonzero(hit)
+        result[rows] = values[self.T[start[rows], cols]]
+        return result.reshape((-1,) + self.values.shape[1:])
+
+    def __call__(self, Q, chunk=65536, workers=1):
+        # queries are independent, chunks can go to a thread pool (numpy releases the GIL)
+        Q = np.asarray(Q, dtype=float).reshape(-1, 2)
+        chunks = [Q[i:i + chunk] for i in range(0, Q.shape[0], chunk)]
+        if workers == 1 or len(chunks) <= 1:
+            parts = [self.evaluate(c) for c in chunks]
+        else:
+            with ThreadPoolExecutor(workers) as pool:
+                parts = list(pool.map(self.evaluate, chunks))
+        if not parts:
+            return np.zeros((0,) + self.values.shape[1:])
+        return np.concatenate(parts)
+
+
+def natural_neighbor(P, values, Q, chunk=65536, workers=1):
+    return NaturalNeighbor(P, values)(Q, chunk, workers)
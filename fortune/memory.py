@@ -0,0 +1,144 @@
+import argparse
+import contextlib
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import matplotlib.tri
+import numpy as np
+
+from fortune import fortune1
+from fortune.Voronoi import Voronoi
+from fortune.fortune2 import circumcircle2, clip_segments, default_bbox, voronoi2_chunked
+from fortune.incremental import Triangulation
+
+# the harness's own bookkeeping is left out of the call sites
+IGNORE = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+
+
+@contextlib.contextmanager
+def stage(stages, name, top=5):
+    # time, peak and retained traced bytes, net new memory blocks, gc runs per generation and the
+    # top call sites by retained bytes of the code in the with block; tracemalloc has to be on
+    gc.collect()
+    before = tracemalloc.take_snapshot().filter_traces(IGNORE)
+    collections = [s['collections'] for s in gc.get_stats()]
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    t = time.perf_counter()
+    yield
+    t = time.perf_counter() - t
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot().filter_traces(IGNORE)
+    diff = after.compare_to(before, 'lineno')
+    stages.append({
+        'stage': name,
+        'seconds': t,
+        'peak_bytes': peak - start,
+        'retained_bytes': current - start,
+        'blocks': sum(d.count_diff for d in diff),
+        'gc_collections': [s['collections'] - c for s, c in zip(gc.get_stats(), collections)],
+        'top': [{'site': '%s:%d' % (d.traceback[0].filename, d.traceback[0].lineno),
+                 'bytes': d.size_diff, 'blocks': d.count_diff} for d in diff[:top]],
+    })
+
+
+def profile_fortune(P, top):
+    stages = []
+    with stage(stages, 'queue', top):
+        v = Voronoi(P)
+    with stage(stages, 'sweep', top):
+        v.process()
+        v.finish_edges()
+    with stage(stages, 'get_output', top):
+        v.get_output()
+    return stages
+
+
+def profile_voronoi2(P, top):
+    # the stages of fortune2.voronoi2
+    stages = []
+    bbox = np.round(default_bbox(P), 4)
+    with stage(stages, 'triangulate', top):
+        D = matplotlib.tri.Triangulation(P[:, 0], P[:, 1])
+        T, N = D.triangles, D.neighbors
+    with stage(stages, 'circumcircle2', top):
+        C = circumcircle2(P[T])
+    with stage(stages, 'clip', top):
+        clip_segments(P, T, N, C, bbox)
+    return stages
+
+
+def profile_chunked(P, top):
+    stages = []
+    with stage(stages, 'voronoi2_chunked', top):
+        voronoi2_chunked(P)
+    return stages
+
+
+def profile_incremental(P, top):
+    stages = []
+    with stage(stages, 'triangulate', top):
+        T, N = Triangulation(P).arrays()
+    with stage(stages, 'circumcircle2', top):
+        C = circumcircle2(P[T])
+    with stage(stages, 'clip', top):
+        clip_segments(P, T, N, C, np.round(default_bbox(P), 4))
+    return stages
+
+
+def profile_fortune1(P, top):
+    stages = []
+    with stage(stages, 'voronoi', top):
+        fortune1.voronoi(P[:, 0], P[:, 1])
+    return stages
+
+
+PROFILES = {
+    'fortune': profile_fortune,
+    'voronoi2': profile_voronoi2,
+    'voronoi2_chunked': profile_chunked,
+    'incremental': profile_incremental,
+    'fortune1': profile_fortune1,
+}
+
+
+def profile(engines=('fortune', 'voronoi2'), sizes=(1000, 10000), top=5, seed=0, frames=1):
+    # one entry per engine and size on uniform random sites, frames is the traceback depth kept
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start(frames)
+    random = np.random.RandomState(seed)
+    runs = []
+    try:
+        for n in sizes:
+            P = random.rand(n, 2) * 100
+            for engine in engines:
+                runs.append({'engine': engine, 'n': n, 'stages': PROFILES[engine](P, top)})
+    finally:
+        if not started:
+            tracemalloc.stop()
+    return {'python': sys.version.split()[0], 'numpy': np.__version__, 'host': platform.node(), 'runs': runs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fortune.memory')
+    parser.add_argument('--engines', nargs='+', default=['fortune', 'voronoi2'], choices=sorted(PROFILES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--top', type=int, default=5, help='call sites kept per stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+    report = profile(args.engines, args.sizes, args.top, args.seed)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+
+from fortune.adjacency import edges_to_csr, to_matrix
+from fortune.clip import cell_edges, split
+from fortune.fortune2 import clip_segments, triangulate
+
+SHIFTS = [(sx, sy) for sx in (-1, 0, 1) for sy in (-1, 0, 1) if sx or sy]
+
+
+def replicate(P, box, halo):
+    # the sites plus their periodic images that fall within halo of the box
+    Q = [P]
+    origin = [np.arange(P.shape[0])]
+    for sx, sy in SHIFTS:
+        S = P + (sx * box[0], sy * box[1])
+        inside = (S[:, 0] >= -halo) & (S[:, 0] <= box[0] + halo) & (S[:, 1] >= -halo) & (S[:, 1] <= box[1] + halo)
+        Q.append(S[inside])
+        origin.append(np.flatnonzero(inside))
+    return np.concatenate(Q), np.concatenate(origin)
+
+
+def halo_ok(P, T, C, n, box, halo):
+    # a triangle touching a site of the box is final once its circumcircle
+    # lies inside the replicated region, since nothing outside it can break it
+    own = (T < n).any(axis=1)
+    r = np.hypot(C[own, 0] - P[T[own, 0], 0], C[own, 1] - P[T[own, 0], 1])
+    lo = C[own] - r[:, None]
+    hi = C[own] + r[:, None]
+    return bool((lo >= -halo).all() and (hi[:, 0] <= box[0] + halo).all() and (hi[:, 1] <= box[1] + halo).all())
+
+
+def wrap(S, box):
+    # (E, 4) segments cut at the lines x = k * box[0] and y = k * box[1], every piece moved by
+    # whole periods into [0, box), with the row of S it came from
+    item, t = [np.empty(0, dtype=np.int64)], [np.empty(0)]
+    for axis in (0, 1):
+        u0, u1 = S[:, axis] / box[axis], S[:, axis + 2] / box[axis]
+        lo = np.floor(np.minimum(u0, u1)).astype(np.int64) + 1
+        hi = np.ceil(np.maximum(u0, u1)).astype(np.int64) - 1
+        count = np.maximum(hi - lo + 1, 0)
+        row = np.repeat(np.arange(S.shape[0]), count)
+        k = lo[row] + np.arange(row.size) - (np.cumsum(count) - count)[row]
+        item.append(row)
+        t.append((k - u0[row]) / (u1[row] - u0[row]))
+    pieces, row = split(S, np.concatenate(item), np.concatenate(t))
+    # a crossing through a corner of the period grid leaves an empty piece
+    ok = (pieces[:, :2] != pieces[:, 2:]).any(axis=1)
+    pieces, row = pieces[ok], row[ok]
+    shift = np.floor(0.5 * (pieces[:, :2] + pieces[:, 2:]) / box) * box
+    return pieces - np.tile(shift, 2), row
+
+
+def voronoi_periodic(P, box=(1.0, 1.0), halo=None, return_cells=False):
+    # Voronoi diagram on the torus [0, box[0]) x [0, box[1]), every edge wrapped onto the box
+    # (cut in pieces where it crosses the boundary) with its two sites; with return_cells also
+    # the CSR (indptr, piece ids) of the pieces bounding each site's cell, as clip.cell_edges.
+    # Only the sites within the halo of the boundary are replicated
+    P = np.mod(np.asarray(P, dtype=float), box)
+    n = P.shape[0]
+    if halo is None:
+        halo = 3.0 * np.sqrt(box[0] * box[1] / n)
+    while True:
+        halo = min(halo, max(box))
+        Q, origin = replicate(P, box, halo)
+        T, N, C = triangulate(Q)
+        if halo >= max(box) or halo_ok(Q, T, C, n, box, halo):
+            break
+        halo *= 2.0
+    bbox = (-halo, -halo, box[0] + halo, box[1] + halo)
+    segments, sites = clip_segments(Q, T, N, C, bbox)
+    # keep one copy per periodic edge: the one seen from the site of the
+    # pair with the lower index, taken inside the box; a site next to its own
+    # image sees the edge in both directions, keep the image shifted to +x (or +y)
+    a, b = sites[:, 0], sites[:, 1]
+    shift = np.round((Q[b] - Q[a]) / box)
+    ahead = (shift[:, 0] > 0) | ((shift[:, 0] == 0) & (shift[:, 1] > 0))
+    keep = (a < n) & ((origin[a] < origin[b]) | ((origin[a] == origin[b]) & ahead))
+    segments, row = wrap(np.array(segments, dtype=float).reshape(-1, 4)[keep], box)
+    sites = origin[sites[keep]][row]
+    if return_cells:
+        return segments.reshape(-1, 2, 2), sites, cell_edges(sites, n)
+    return segments.reshape(-1, 2, 2), sites
+
+
+def adjacency_periodic(P, box=(1.0, 1.0), halo=None, as_matrix=True):
+    _, sites = voronoi_periodic(P, box, halo)
+    n = len(P)
+    indptr, indices = edges_to_csr(sites[:, 0], sites[:, 1], n)
+    if as_matrix:
+        return to_matrix(indptr, indices, n)
+    return indptr, indices
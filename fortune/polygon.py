@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def as_rings(polygon):
+    # a single (m, 2) ring or a list of rings (outer boundary and holes)
+    if isinstance(polygon, np.ndarray) and polygon.ndim == 2:
+        return [polygon.astype(float)]
+    return [np.asarray(ring, dtype=float) for ring in polygon]
+
+
+class PolygonIndex:
+    # boundary edges of a polygon with holes, bucketed into horizontal bands so that
+    # a query only looks at the edges whose y range overlaps its own band
+    def __init__(self, polygon, bands=None):
+        rings = as_rings(polygon)
+        self.rings = rings
+        self.edges = np.concatenate([np.column_stack((r, np.roll(r, -1, axis=0))) for r in rings])
+        E = self.edges
+        self.ymin = E[:, [1, 3]].min()
+        self.ymax = E[:, [1, 3]].max()
+        self.xmin = E[:, [0, 2]].min()
+        self.xmax = E[:, [0, 2]].max()
+        self.bands = bands or max(1, int(np.sqrt(E.shape[0])))
+        self.h = (self.ymax - self.ymin) / self.bands or 1.0
+        lo = self.band(np.minimum(E[:, 1], E[:, 3]))
+        hi = self.band(np.maximum(E[:, 1], E[:, 3]))
+        count = hi - lo + 1
+        edge = np.repeat(np.arange(E.shape[0]), count)
+        start = np.cumsum(count) - count
+        band = lo[edge] + np.arange(edge.size) - start[edge]
+        order = np.argsort(band, kind='stable')
+        self.band_edges = edge[order]
+        self.band_ptr = np.zeros(self.bands + 1, dtype=np.int64)
+        np.cumsum(np.bincount(band, minlength=self.bands), out=self.band_ptr[1:])
+
+    def band(self, y):
+        return np.clip(((y - self.ymin) / self.h).astype(np.int64), 0, self.bands - 1)
+
+    def candidates(self, X):
+        # (query, edge) pairs for the edges sharing the band of each query
+        b = self.band(X[:, 1])
+        count = self.band_ptr[b + 1] - self.band_ptr[b]
+        query = np.repeat(np.arange(X.shape[0]), count)
+        start = np.cumsum(count) - count
+        edge = self.band_edges[self.band_ptr[b][query] + np.arange(query.size) - start[query]]
+        return query, edge
+
+    def contains(self, X):
+        # even-odd rule, so holes fall out of the ring list directly
+        X = np.asarray(X, dtype=float).reshape(-1, 2)
+        inside = np.zeros(X.shape[0], dtype=bool)
+        box = (X[:, 0] >= self.xmin) & (X[:, 0] <= self.xmax) & (X[:, 1] >= self.ymin) & (X[:, 1] <= self.ymax)
+        idx = np.flatnonzero(box)
+        query, edge = self.candidates(X[idx])
+        x, y = X[idx[query], 0], X[idx[query], 1]
+        x0, y0, x1, y1 = self.edges[edge].T
+        crosses = (y0 > y) != (y1 > y)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            crosses &= x < x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        inside[idx] = np.bincount(query[crosses], minlength=idx.size) % 2 == 1
+        return inside
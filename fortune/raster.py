@@ -0,0 +1,138 @@
+import numpy as np
+
+from fortune.fortune2 import clip_box
+
+
+def pixel_centers(shape, bbox):
+    # x of the column centers and y of the row centers of a (rows, columns) grid over bbox
+    h, w = shape
+    dx = (bbox[2] - bbox[0]) / float(w)
+    dy = (bbox[3] - bbox[1]) / float(h)
+    return bbox[0] + (np.arange(w) + 0.5) * dx, bbox[1] + (np.arange(h) + 0.5) * dy
+
+
+def row_crossings(segments, shape, bbox):
+    # every (segment, row) pair where the segment crosses the row center line, with the crossing x
+    S = np.asarray(segments, dtype=float).reshape(-1, 4)
+    h = shape[0]
+    dy = (bbox[3] - bbox[1]) / float(h)
+    lo = np.minimum(S[:, 1], S[:, 3])
+    hi = np.maximum(S[:, 1], S[:, 3])
+    # half-open rows [lo, hi) so that an edge chain crosses a row once at a shared vertex
+    r0 = np.clip(np.ceil((lo - bbox[1]) / dy - 0.5), 0, h).astype(np.int64)
+    r1 = np.clip(np.ceil((hi - bbox[1]) / dy - 0.5), 0, h).astype(np.int64)
+    count = np.maximum(r1 - r0, 0)
+    seg = np.repeat(np.arange(S.shape[0]), count)
+    start = np.cumsum(count) - count
+    rows = r0[seg] + np.arange(seg.size) - start[seg]
+    y = bbox[1] + (rows + 0.5) * dy
+    x0, y0, x1, y1 = S[seg, 0], S[seg, 1], S[seg, 2], S[seg, 3]
+    x = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return seg, rows, x
+
+
+def nearest_site(points, X, Y, chunk=4096):
+    # brute force nearest site, only used for the few rows no edge crosses
+    labels = np.empty(X.size, dtype=np.int64)
+    for i in range(0, X.size, chunk):
+        d = np.square(X[i:i + chunk, None] - points[None, :, 0]) + np.square(Y[i:i + chunk, None] - points[None, :, 1])
+        labels[i:i + chunk] = d.argmin(axis=1)
+    return labels
+
+
+def rasterize(points, segments, sites, shape, bbox, distance=False):
+    # nearest-site label grid filled row by row between the edge crossings,
+    # the diagram has to cover bbox (voronoi2 clipped to it, or finished Voronoi edges)
+    points = np.asarray(points, dtype=float)
+    sites = np.asarray(sites, dtype=np.int64).reshape(-1, 2)
+    h, w = shape
+    dx = (bbox[2] - bbox[0]) / float(w)
+    X, Y = pixel_centers(shape, bbox)
+
+    seg, rows, x = row_crossings(segments, shape, bbox)
+    a, b = sites[seg, 0], sites[seg, 1]
+    # moving towards +x the site with the larger x wins
+    b_right = points[b, 0] > points[a, 0]
+    right = np.where(b_right, b, a)
+    left = np.where(b_right, a, b)
+    cols = np.clip(np.ceil((x - bbox[0]) / dx - 0.5), 0, w).astype(np.int64)
+    order = np.lexsort((x, rows))
+    rows, cols, left, right = rows[order], cols[order], left[order], right[order]
+    keep = cols < w
+
+    # label of the first pixel of every row
+    first = np.full(h, -1, dtype=np.int64)
+    head = np.ones(rows.size, dtype=bool)
+    head[1:] = rows[1:] != rows[:-1]
+    first[rows[head]] = left[head]
+    empty = np.flatnonzero(first < 0)
+    if empty.size:
+        first[empty] = nearest_site(points, np.full(empty.size, X[0]), Y[empty])
+
+    # label changes along the flattened grid, summed back up
+    pos = np.concatenate((np.arange(h) * w, rows[keep] * w + cols[keep]))
+    value = np.concatenate((first, right[keep]))
+    order = np.argsort(pos, kind='stable')
+    pos, value = pos[order], value[order]
+    delta = np.diff(value, prepend=0)
+    labels = np.zeros(h * w, dtype=np.int64)
+    np.add.at(labels, pos, delta)
+    labels = np.cumsum(labels).reshape(h, w)
+
+    if not distance:
+        return labels
+    dist = np.hypot(X[None, :] - points[labels, 0], Y[:, None] - points[labels, 1])
+    return labels, dist
+
+
+def draw_segments(segments, shape, bbox, antialias=True, lod=1.0, chunk=1 << 18):
+    # (rows, columns) image of the length of segment, in pixels, falling in every pixel: each
+    # segment is sampled once per pixel of its length and the samples are added to their pixel,
+    # or spread over the four nearest pixel centers with antialias; segments shorter than lod
+    # pixels are only one sample at their middle, which is all a zoomed out preview needs
+    S = np.asarray(segments, dtype=float).reshape(-1, 4)
+    h, w = shape
+    dx = (bbox[2] - bbox[0]) / float(w)
+    dy = (bbox[3] - bbox[1]) / float(h)
+    # to pixel units, then cut to the image and a pixel around it so that the samples only
+    # cover what can be drawn
+    S = (S - (bbox[0], bbox[1], bbox[0], bbox[1])) / (dx, dy, dx, dy)
+    S, _ = clip_box(S, (-1, -1, w + 1, h + 1))
+    length = np.hypot(S[:, 2] - S[:, 0], S[:, 3] - S[:, 1])
+    count = np.where(length < lod, 1, np.maximum(np.ceil(length), 1)).astype(np.int64)
+    image = np.zeros(h * w)
+    total = np.cumsum(count)
+    start = 0
+    while start < S.shape[0]:
+        # as many segments as fit in chunk samples, at least one
+        stop = max(start + 1, int(np.searchsorted(total, total[start] - count[start] + chunk, side='right')))
+        c = count[start:stop]
+        seg = np.repeat(np.arange(start, stop), c)
+        t = (np.arange(seg.size) - (np.cumsum(c) - c)[seg - start] + 0.5) / count[seg]
+        u = S[seg, 0] + t * (S[seg, 2] - S[seg, 0])
+        v = S[seg, 1] + t * (S[seg, 3] - S[seg, 1])
+        weight = length[seg] / count[seg]
+        if antialias:
+            u, v = u - 0.5, v - 0.5
+            i, j = np.floor(u).astype(np.int64), np.floor(v).astype(np.int64)
+            fu, fv = u - i, v - j
+            corners = ((0, 0, (1 - fu) * (1 - fv)), (1, 0, fu * (1 - fv)), (0, 1, (1 - fu) * fv), (1, 1, fu * fv))
+        else:
+            i, j = np.floor(u).astype(np.int64), np.floor(v).astype(np.int64)
+            corners = ((0, 0, 1.0),)
+        for di, dj, f in corners:
+            ii, jj = i + di, j + dj
+            ok = (ii >= 0) & (ii < w) & (jj >= 0) & (jj < h)
+            image += np.bincount(jj[ok] * w + ii[ok], (weight * f)[ok] if antialias else weight[ok], minlength=h * w)
+        start = stop
+    return image.reshape(h, w)
+
+
+def save_png(path, image, vmax=None, cmap='gray_r'):
+    # a draw_segments image as a PNG, row 0 at the bottom as in bbox; values above vmax
+    # (by default the 99th percentile of the lit pixels) saturate
+    import matplotlib.image
+    if vmax is None:
+        lit = image[image > 0]
+        vmax = np.percentile(lit, 99) if lit.size else 1.0
+    matplotlib.image.imsave(path, np.minimum(image, vmax), vmin=0.0, vmax=vmax, cmap=cmap, origin='lower')
@@ -0,0 +1,166 @@
+import asyncio
+import collections
+import functools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fortune import engines
+
+LIMIT = 1 << 28  # longest request or response line, in bytes
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class Metrics:
+    def __init__(self, window=1024):
+        self.queued = 0  # admitted, waiting for a worker
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.cached = 0
+        self.latency = collections.deque(maxlen=window)  # seconds, admission to result
+
+    def snapshot(self):
+        lat = np.array(self.latency) if self.latency else np.zeros(1)
+        return {
+            'queue_depth': self.queued,
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'cached': self.cached,
+            'latency_mean': float(lat.mean()),
+            'latency_p50': float(np.percentile(lat, 50)),
+            'latency_p95': float(np.percentile(lat, 95)),
+            'latency_max': float(lat.max()),
+        }
+
+
+class DiagramService:
+    # runs engine calls in a bounded process pool, identical in-flight requests share one result,
+    # at most max_pending requests are admitted and the rest wait (or get ServiceBusy with wait=False)
+    def __init__(self, workers=None, max_pending=None, executor=None, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.workers
+        self.executor = executor or ProcessPoolExecutor(self.workers)
+        self.cache = cache  # optional fortune.cache.DiagramCache
+        self.metrics = Metrics()
+        self._admit = asyncio.Semaphore(self.max_pending)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._inflight = {}
+
+    async def compute(self, engine, points, wait=True, **options):
+        if engine not in engines.ENGINES:
+            raise KeyError(engine)
+        points = np.asarray(points, dtype=float)
+        key = engines.digest(engine, points, options)
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                self.metrics.cached += 1
+                return result
+        entry = self._inflight.get(key)
+        if entry is not None and entry[1]:
+            self.metrics.coalesced += 1
+        else:
+            if not wait and self._admit.locked():
+                self.metrics.rejected += 1
+                raise ServiceBusy('%d requests pending' % self.max_pending)
+            # the engine call runs in its own task shared by every identical request, a caller
+            # going away only cancels it once nobody else waits on it
+            entry = [asyncio.ensure_future(self._run(key, engine, points, options)), 0]
+            self._inflight[key] = entry
+            entry[0].add_done_callback(functools.partial(self._done, key, entry))
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                entry[0].cancel()
+
+    def _done(self, key, entry, task):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def _run(self, key, engine, points, options):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self.metrics.queued += 1
+        started = False
+        try:
+            async with self._admit, self._slots:
+                self.metrics.queued -= 1
+                self.metrics.running += 1
+                started = True
+                try:
+                    call = functools.partial(engines.run, engine, points, **options)
+                    result = await loop.run_in_executor(self.executor, call)
+                finally:
+                    self.metrics.running -= 1
+        except BaseException:
+            if not started:
+                self.metrics.queued -= 1
+            self.metrics.failed += 1
+            raise
+        self.metrics.completed += 1
+        self.metrics.latency.append(time.perf_counter() - start)
+        if self.cache is not None:
+            result = self.cache.put(key, result)
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+async def handle(service, reader, writer):
+    # one JSON request per line: {"engine": ..., "points": [[x, y], ...], "options": {...}} or {"metrics": true}
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if request.get('metrics'):
+                    response = service.metrics.snapshot()
+                else:
+                    segments = await service.compute(request['engine'], request['points'],
+                                                     wait=request.get('wait', True), **request.get('options', {}))
+                    response = {'segments': segments.tolist()}
+            except ServiceBusy as e:
+                response = {'error': 'busy', 'detail': str(e)}
+            except Exception as e:
+                response = {'error': type(e).__name__, 'detail': str(e)}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(service, host='127.0.0.1', port=0):
+    return await asyncio.start_server(functools.partial(handle, service), host, port, limit=LIMIT)
+
+
+async def main(port=8765):
+    service = DiagramService()
+    server = await serve(service, port=port)
+    print('serving on', server.sockets[0].getsockname())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+import numpy as np
+
+# neighbour cells to compare with, each unordered pair of cells once
+OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def close_pairs(P, tol):
+    # pairs (i, j), i < j, of sites at most tol apart, found through a grid of cell size tol
+    cell = np.floor(P / tol).astype(np.int64)
+    cell -= cell.min(axis=0) - 1
+    width = cell[:, 1].max() + 2
+    key = cell[:, 0] * width + cell[:, 1]
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+    I, J = [], []
+    for dx, dy in OFFSETS:
+        other = key + dx * width + dy
+        lo = np.searchsorted(sorted_key, other, side='left')
+        hi = np.searchsorted(sorted_key, other, side='right')
+        count = hi - lo
+        i = np.repeat(np.arange(P.shape[0]), count)
+        j = order[lo[i] + np.arange(i.size) - (np.cumsum(count) - count)[i]]
+        keep = (i < j) if (dx, dy) == (0, 0) else np.ones(i.size, dtype=bool)
+        i, j = i[keep], j[keep]
+        near = np.square(P[i] - P[j]).sum(axis=1) <= tol * tol
+        I.append(i[near])
+        J.append(j[near])
+    return np.concatenate(I), np.concatenate(J)
+
+
+def snap(P, tol=0.0):
+    # merge sites closer than tol (exact duplicates with tol=0), chains of close sites end up
+    # in one cluster; returns the cleaned sites, one per cluster (its lowest input index), and
+    # for every input site the index of the site it was merged into
+    P = np.asarray(P, dtype=float)
+    if tol <= 0:
+        _, first, mapping = np.unique(P, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.size)
+        return P[first[order]], rank[mapping.ravel()]
+    i, j = close_pairs(P, tol)
+    label = np.arange(P.shape[0])
+    while True:
+        # propagate the smallest index along the pairs, then jump to the root
+        m = np.minimum(label[i], label[j])
+        new = label.copy()
+        np.minimum.at(new, i, m)
+        np.minimum.at(new, j, m)
+        new = new[new]
+        if np.array_equal(new, label):
+            break
+        label = new
+    roots, mapping = np.unique(label, return_inverse=True)
+    return P[roots], mapping
@@ -0,0 +1,130 @@
+import numpy as np
+
+# event kinds
+SITE, CIRCLE, STALE, CLOSE = 0, 1, 2, 3
+# columns of SweepTrace.rows, -1 where unused
+KIND, AFTER, ARC, SPLIT, REMOVED, STARTED, STARTED2, FINISHED, FINISHED2 = range(9)
+
+
+def breakpoints(P0, P1, l):
+    # x, y of the breakpoint between the arcs of sites P0 (below) and P1 at sweep line l,
+    # Voronoi.intersection for arrays
+    x0, y0, x1, y1 = P0[:, 0], P0[:, 1], P1[:, 0], P1[:, 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z0 = 2.0 * (x0 - l)
+        z1 = 2.0 * (x1 - l)
+        a = 1.0 / z0 - 1.0 / z1
+        b = -2.0 * (y0 / z0 - y1 / z1)
+        c = (y0 ** 2 + x0 ** 2 - l ** 2) / z0 - (y1 ** 2 + x1 ** 2 - l ** 2) / z1
+        y = (-b - np.sqrt(b * b - 4 * a * c)) / (2 * a)
+        y = np.where(x0 == x1, (y0 + y1) / 2.0, np.where(x1 == l, y1, np.where(x0 == l, y0, y)))
+        # measured from the site not on the sweep line
+        px, py = np.where(x0 == l, x1, x0), np.where(x0 == l, y1, y0)
+        x = (px ** 2 + (py - y) ** 2 - l ** 2) / (2 * px - 2 * l)
+    return x, y
+
+
+class SweepTrace:
+    # what every event of a Voronoi sweep did, one row of arc and edge ids per event: arcs and
+    # edges are numbered in creation order, the edge numbers are the indices into self.output
+    # of a sweep that is not streamed; pass Voronoi(points, trace=SweepTrace())
+    def __init__(self):
+        self.x = []
+        self.rows = []
+        self.arc_site = []
+        self.edge_start = []
+        self.edge_sites = []
+        self.edge_end = {}
+
+    def arc(self, a):
+        a.id = len(self.arc_site)
+        self.arc_site.append(a.p.index)
+        return a.id
+
+    def edge(self, s):
+        s.id = len(self.edge_start)
+        self.edge_start.append((s.start.x, s.start.y))
+        self.edge_sites.append((s.a.index, s.b.index))
+        return s.id
+
+    def end(self, s):
+        self.edge_end[s.id] = (s.end.x, s.end.y)
+        return s.id
+
+    def record(self, x, kind, after=-1, arc=-1, split=-1, removed=-1, started=(), finished=()):
+        started = tuple(started) + (-1, -1)
+        finished = tuple(finished) + (-1, -1)
+        self.x.append(x)
+        self.rows.append((kind, after, arc, split, removed, started[0], started[1], finished[0], finished[1]))
+
+    def arrays(self):
+        # (R,) sweep positions, (R, 9) int64 rows, (A,) site of every arc, and per edge its
+        # (E, 2) start, (E, 2) end (NaN while open) and (E, 2) sites
+        end = np.full((len(self.edge_start), 2), np.nan)
+        if self.edge_end:
+            end[list(self.edge_end)] = list(self.edge_end.values())
+        return (np.array(self.x, dtype=float), np.array(self.rows, dtype=np.int64).reshape(-1, 9),
+                np.array(self.arc_site, dtype=np.int64), np.array(self.edge_start, dtype=float).reshape(-1, 2),
+                end, np.array(self.edge_sites, dtype=np.int64).reshape(-1, 2))
+
+    def frame(self, x, points):
+        # state of the sweep once every event up to x is handled, see frames
+        return next(self.frames([x], points))
+
+    def frames(self, positions, points):
+        # for increasing sweep positions, the state once every event up to there is handled:
+        # the arc ids of the beach line from low to high y, the finished and the open edge ids,
+        # and (E, 2, 2) lines with the open edges drawn up to their breakpoint; the events are
+        # replayed once for all positions
+        X, R, arc_site, start, end, _ = self.arrays()
+        P = np.asarray(points, dtype=float)
+        nxt, prv, right = {}, {}, {}
+        first = -1
+        finished = set()
+        done_rows = 0
+        for x in positions:
+            stop = np.searchsorted(X, x, side='right')
+            for row in R[done_rows:stop].tolist():
+                kind = row[KIND]
+                if kind == SITE:
+                    a, i = row[ARC], row[AFTER]
+                    if i < 0:
+                        first = a
+                        prv[a], nxt[a] = -1, -1
+                    elif row[SPLIT] >= 0:
+                        c = row[SPLIT]
+                        j = nxt[i]
+                        nxt[i], prv[a], nxt[a], prv[c], nxt[c] = a, i, c, a, j
+                        if j >= 0:
+                            prv[j] = c
+                        if i in right:
+                            right[c] = right[i]
+                        right[i], right[a] = row[STARTED], row[STARTED2]
+                    else:
+                        nxt[i], prv[a], nxt[a] = a, i, -1
+                        right[i] = row[STARTED]
+                elif kind == CIRCLE:
+                    a = row[REMOVED]
+                    i, j = prv.pop(a), nxt.pop(a)
+                    nxt[i], prv[j] = j, i
+                    right.pop(a, None)
+                    right[i] = row[STARTED]
+                for f in (row[FINISHED], row[FINISHED2]):
+                    if f >= 0:
+                        finished.add(f)
+            done_rows = max(done_rows, stop)
+            arcs = []
+            a = first
+            while a >= 0:
+                arcs.append(a)
+                a = nxt[a]
+            arcs = np.array(arcs, dtype=np.int64)
+            done = np.array(sorted(finished), dtype=np.int64)
+            # an open edge ends at the breakpoint between its arc and the next one
+            below = np.array([i for i in arcs.tolist() if i in right and right[i] not in finished], dtype=np.int64)
+            open_edges = np.array([right[i] for i in below.tolist()], dtype=np.int64)
+            above = np.array([nxt[i] for i in below.tolist()], dtype=np.int64)
+            bx, by = breakpoints(P[arc_site[below]].reshape(-1, 2), P[arc_site[above]].reshape(-1, 2), x)
+            lines = np.concatenate((np.column_stack((start[done], end[done])),
+                                    np.column_stack((start[open_edges], bx, by)))).reshape(-1, 2, 2)
+            yield {'sweep': x, 'arcs': arcs, 'sites': arc_site[arcs], 'done': done, 'open': open_edges, 'lines': lines}
@@ -0,0 +1,98 @@
+import numpy as np
+
+from fortune.fortune2 import clip_box
+
+
+def cover(lo, hi, shape):
+    # (item, cell) for every cell of an (nx, ny) grid in the cell rectangles lo..hi, cells row by row
+    w = hi[:, 0] - lo[:, 0] + 1
+    count = w * (hi[:, 1] - lo[:, 1] + 1)
+    item = np.repeat(np.arange(lo.shape[0]), count)
+    r = np.arange(item.size) - (np.cumsum(count) - count)[item]
+    ix = lo[item, 0] + r % w[item]
+    iy = lo[item, 1] + r // w[item]
+    return item, iy * shape[0] + ix
+
+
+def bucket(lo, hi, shape):
+    # CSR (cell_ptr, items) of the items registered in every cell they cover
+    item, cells = cover(lo, hi, shape)
+    order = np.argsort(cells, kind='stable')
+    ptr = np.zeros(shape[0] * shape[1] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=shape[0] * shape[1]), out=ptr[1:])
+    return ptr, item[order]
+
+
+class EdgeIndex:
+    # uniform grid over the bounding boxes of (E, 2, 2) or (E, 4) edges, every edge registered in
+    # the cells its box covers (cell ids in CSR form), so a window only reads its own cells
+    def __init__(self, segments, per_cell=4, shape=None):
+        S = np.asarray(segments, dtype=float).reshape(-1, 4)
+        self.segments = S
+        lo = np.minimum(S[:, :2], S[:, 2:])
+        hi = np.maximum(S[:, :2], S[:, 2:])
+        if S.shape[0]:
+            self.origin = lo.min(axis=0)
+            extent = np.maximum(hi.max(axis=0) - self.origin, 1e-300)
+        else:
+            self.origin, extent = np.zeros(2), np.ones(2)
+        if shape is None:
+            # about per_cell edges a cell, cells as square as the extent allows
+            cells = max(1.0, S.shape[0] / float(per_cell))
+            nx = int(np.clip(np.sqrt(cells * extent[0] / extent[1]), 1, cells))
+            shape = (nx, max(1, int(cells // nx)))
+        self.shape = np.array(shape, dtype=np.int64)
+        self.cell = extent / self.shape
+        self.lo = self.locate(lo)
+        self.hi = self.locate(hi)
+        self.cell_ptr, self.cell_edges = bucket(self.lo, self.hi, self.shape)
+
+    def __len__(self):
+        return self.segments.shape[0]
+
+    def locate(self, X):
+        return np.clip(np.floor((X - self.origin) / self.cell).astype(np.int64), 0, self.shape - 1)
+
+    def query(self, window, exact=False):
+        # indices of the edges whose box meets window (xmin, ymin, xmax, ymax), each once and in
+        # no particular order; with exact=True only the edges crossing the window itself
+        xmin, ymin, xmax, ymax = window
+        S = self.segments
+        if not S.shape[0] or xmax < self.origin[0] or ymax < self.origin[1]:
+            return np.empty(0, dtype=np.int64)
+        lo, hi = self.locate(np.array([[xmin, ymin], [xmax, ymax]]))
+        _, cells = cover(lo[None], hi[None], self.shape)
+        start, stop = self.cell_ptr[cells], self.cell_ptr[cells + 1]
+        count = stop - start
+        slot = np.repeat(np.arange(cells.size), count)
+        edge = self.cell_edges[start[slot] + np.arange(slot.size) - (np.cumsum(count) - count)[slot]]
+        # an edge spanning several cells is reported only from the first of them inside the window
+        cx, cy = cells[slot] % self.shape[0], cells[slot] // self.shape[0]
+        first = (cx == np.maximum(self.lo[edge, 0], lo[0])) & (cy == np.maximum(self.lo[edge, 1], lo[1]))
+        edge = edge[first]
+        s = S[edge]
+        meets = ((np.minimum(s[:, 0], s[:, 2]) <= xmax) & (np.maximum(s[:, 0], s[:, 2]) >= xmin) &
+                 (np.minimum(s[:, 1], s[:, 3]) <= ymax) & (np.maximum(s[:, 1], s[:, 3]) >= ymin))
+        edge = edge[meets]
+        if exact:
+            _, keep = clip_box(S[edge], window)
+            edge = edge[keep]
+        return edge
+
+    def clip(self, window):
+        # the edges inside window, cut to it, with their indices
+        edge = self.query(window)
+        S, keep = clip_box(self.segments[edge], window)
+        return S.reshape(-1, 2, 2), edge[keep]
+
+    def save(self, path):
+        np.savez(path, segments=self.segments, origin=self.origin, cell=self.cell, shape=self.shape,
+                 lo=self.lo, hi=self.hi, cell_ptr=self.cell_ptr, cell_edges=self.cell_edges)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls.__new__(cls)
+        for name in ('segments', 'origin', 'cell', 'shape', 'lo', 'hi', 'cell_ptr', 'cell_edges'):
+            setattr(index, name, data[name])
+        return index
@@ -0,0 +1,60 @@
+import numpy as np
+
+from fortune.fortune2 import dual_edges, triangulate
+from fortune.viewport import EdgeIndex
+
+
+def site_index(P, per_cell=2):
+    # the sites as zero length edges in a viewport grid, queries return the sites in a box
+    P = np.asarray(P, dtype=float)
+    return EdgeIndex(np.column_stack((P, P)), per_cell)
+
+
+def window_ok(Q, S, sites, window, region):
+    # the clipped diagram is exact once, at every corner of every clipped cell, the circle
+    # through the nearest selected site lies in region: no unselected site can be closer there,
+    # and the distance to the nearest site minus the room left in region is convex over a cell
+    ends = S.reshape(-1, 2)
+    r = np.hypot(*(ends - Q[sites[:, [0, 0]].ravel()]).T)
+    corners = np.array([(window[0], window[1]), (window[2], window[1]), (window[0], window[3]), (window[2], window[3])])
+    rc = np.sqrt(np.square(corners[:, None] - Q[None]).sum(axis=2).min(axis=1))
+    X = np.concatenate((ends, corners))
+    r = np.concatenate((r, rc))[:, None]
+    return bool(((X - r) >= region[:2]).all() and ((X + r) <= region[2:]).all())
+
+
+def voronoi_window(P, window, halo=None, index=None, return_sites=False):
+    # the Voronoi diagram of all of P clipped to window (xmin, ymin, xmax, ymax), computed from
+    # the sites within halo of it only; the halo doubles until window_ok, pass index=site_index(P)
+    # to keep the site grid across windows
+    P = np.asarray(P, dtype=float)
+    n = P.shape[0]
+    if index is None:
+        index = site_index(P)
+    window = np.asarray(window, dtype=float)
+    if halo is None:
+        # about three site spacings of the whole set
+        extent = index.cell * index.shape
+        halo = 3.0 * np.sqrt(extent[0] * extent[1] / max(n, 1))
+    halo = max(halo, 1e-12 * max(np.abs(window).max(), 1.0))
+    while True:
+        region = window + (-halo, -halo, halo, halo)
+        local = np.sort(index.query(region))
+        complete = local.size == n
+        if local.size >= 3:
+            Q = P[local]
+            try:
+                T, N, _ = triangulate(Q)
+            except (RuntimeError, ValueError):
+                # all selected sites on a line
+                T = None
+            if T is not None:
+                S, sites = dual_edges(Q, T, N, window, return_sites=True)
+                if complete or window_ok(Q, S, sites, window, region):
+                    break
+        if complete:
+            raise ValueError('a Voronoi diagram needs at least three sites not on one line')
+        halo *= 2.0
+    if return_sites:
+        return S, local[sites]
+    return S
@@ -4,6 +4,9 @@
 # Compute the Voronoï diagram of a set of points
 #
 
+import heapq
+import itertools
+import random
 from math import sqrt
 
 
@@ -36,14 +39,19 @@ class Point(object):
     def __sub__(self, other):
         return self + (-other)
 
-    def __div__(self, other):
+    def __truediv__(self, other):
         return self.__class__(self.x / other, self.y / other)
 
-    def __cmp__(self, other):
-        cmp_x = cmp(self.x, other.x)
-        if cmp_x != 0:
-            return cmp_x
-        return cmp(self.y, other.y)
+    def __eq__(self, other):
+        if not isinstance(other, Point):
+            return NotImplemented
+        return (self.x, self.y) == (other.x, other.y)
+
+    def __lt__(self, other):
+        return (self.x, self.y) < (other.x, other.y)
+
+    def __hash__(self):
+        return hash((self.x, self.y))
 
     def __abs__(self):
         return self.norm
@@ -149,78 +157,107 @@ def circumcircle(p1, p2, p3):
     return (p, r)
 
 
-class Heap(object):
-    """A basic implementation of a heap"""
+class Queue(object):
+    """A max-queue of events ordered on their y coordinate, based on heapq
+    Entries are (-y, count, event) tuples so that the heap never compares events.
+    """
     def __init__(self, items=None):
-        if items is None:
-            self._items = []
-        else:
-            self._items = list(items)
-            N = len(self._items) // 2
-            for i in range(0, N):
-                self._heapify(N - i)
+        self._counter = itertools.count()
+        self._items = [(-item.y, next(self._counter), item) for item in items or ()]
+        heapq.heapify(self._items)
 
     def __repr__(self):
-        return "%s(%r)" % (self.__class__.__name__, self._items)
+        return "%s(%r)" % (self.__class__.__name__, [item for _, _, item in self._items])
 
-    def __nonzero__(self):
+    def __bool__(self):
         return bool(self._items)
 
-    def _heapify(self, i):
-        size = len(self._items)
-        left = 2 * i
-        right = left + 1
-
-        m = i
-        if left <= size and self._items[left - 1] > self._items[m - 1]:
-            m = left
-        if right <= size and self._items[right - 1] > self._items[m - 1]:
-            m = right
-        if m != i:
-            _temp = self._items[i - 1]
-            self._items[i - 1] = self._items[m - 1]
-            self._items[m - 1] = _temp
-            self._heapify(m)
+    def __len__(self):
+        return len(self._items)
 
-    def insert(self, item):
-        self._items.append(item)
-        self._sift_up()
+    def __iter__(self):
+        while self:
+            yield self.pop_max()
 
-    def _sift_up(self):
-        k = len(self._items)
-        v = self._items[k - 1]
-        while k > 1 and v > self._items[k // 2 - 1]:
-            self._items[k - 1] = self._items[k // 2 - 1]
-            k = k // 2
-        self._items[k - 1] = v
+    def insert(self, item):
+        heapq.heappush(self._items, (-item.y, next(self._counter), item))
 
     def pop_max(self):
-        if len(self._items) == 1:
-            return self._items.pop()
-        v = self._items[0]
-        self._items[0] = self._items.pop()
-        self._sift_down()
-        return v
-
-    def _sift_down(self):
-        k = 1
-        l = len(self._items)
-        v = self._items[0]
-        while k <= l // 2:
-            j = 2 * k
-            if j < l and self._items[j - 1] <= self._items[j]:
-                j += 1
-            if v >= self._items[j - 1]:
-                break
-            self._items[k - 1] = self._items[j - 1]
-            k = j
-        self._items[k - 1] = v
-
-class Queue(Heap):
-    """A queue based on a heap"""
+        return heapq.heappop(self._items)[-1]
+
+
+class BeachLine(object):
+    """The arcs of the beach line, kept in a treap ordered from left to right
+    The arcs stay linked through left/right; the treap only serves to find the arc
+    above a site in O(log n) expected time.
+    """
+    def __init__(self):
+        self.root = None
+
     def __iter__(self):
-        while self:
-            yield self.pop_max()
+        arc = self.root
+        while arc is not None and arc.left is not None:
+            arc = arc.left
+        while arc is not None:
+            yield arc
+            arc = arc.right
+
+    def find(self, site):
+        node = self.root
+        while node is not None:
+            low, high = node.get_interval(site.y)
+            if low is not None and site.x < low:
+                node = node.children[0]
+            elif high is not None and site.x > high:
+                node = node.children[1]
+            else:
+                return node
+
+    def insert_after(self, arc, new):
+        new.priority = random.random()
+        if arc is None:
+            self.root = new
+            return
+        if arc.children[1] is None:
+            arc.children[1] = new
+        else:
+            arc = arc.children[1]
+            while arc.children[0] is not None:
+                arc = arc.children[0]
+            arc.children[0] = new
+        new.parent = arc
+        while new.parent is not None and new.parent.priority < new.priority:
+            self._rotate_up(new)
+
+    def remove(self, arc):
+        while arc.children[0] is not None or arc.children[1] is not None:
+            left, right = arc.children
+            if right is None or (left is not None and left.priority > right.priority):
+                self._rotate_up(left)
+            else:
+                self._rotate_up(right)
+        parent = arc.parent
+        if parent is None:
+            self.root = None
+        else:
+            parent.children[parent.children[1] is arc] = None
+        arc.parent = None
+
+    def _rotate_up(self, node):
+        parent = node.parent
+        side = parent.children[1] is node
+        inner = node.children[not side]
+        parent.children[side] = inner
+        if inner is not None:
+            inner.parent = parent
+        node.children[not side] = parent
+        grand = parent.parent
+        parent.parent = node
+        node.parent = grand
+        if grand is None:
+            self.root = node
+        else:
+            grand.children[grand.children[1] is parent] = node
 
 #
 # Main class used for Voronoï diagram computation
@@ -237,8 +274,9 @@ class Voronoi(object):
     """
     def __init__(self, sites, bounding_box=None):
         self._queue = Queue([SiteEvent(s) for s in sites])
-        self._beach_line = None
+        self._beach_line = BeachLine()
         self._faces = {}
+        self._half_edges = {}
         self.vertices = []
         self.edges = []
 
@@ -260,6 +298,8 @@ class Voronoi(object):
         self.edges.append(half_edge)
         self._faces[site1] = half_edge
         self._faces[site2] = half_edge._twin
+        self._half_edges[site1, site2] = half_edge
+        self._half_edges[site2, site1] = half_edge._twin
 
         return half_edge
 
@@ -295,40 +335,31 @@ class Voronoi(object):
         for left, right in (
                 (event.arc.left.site, event.arc.site),
                 (event.arc.site, event.arc.right.site)):
-            half_edge = None
-            for he in self._faces[left]._iter_neighbours():
-                if he._twin._site == right:
-                    half_edge = he
-                    break
-            half_edge._origin = event.circle[0]
+            self._half_edges[left, right]._origin = event.circle[0]
         # Check two new triples for circle events
         for e in _build_circle_events(removed_on=removed_on):
             self._queue.insert(e)
 
     def _find_arc_above(self, site):
-        if self._beach_line is None:
-            return
-        for arc in self._beach_line:
-            low, high = arc.get_interval(site.y)
-            if high is None or high >= site.x:
-                assert low is None or site.x >= low
-                return arc
+        return self._beach_line.find(site)
 
     def _insert_beach_line(self, site):
         arc = self._find_arc_above(site)
         if arc is None:
-            self._beach_line = Arc(site)
-            return self._beach_line
+            inserted = Arc(site)
+            self._beach_line.insert_after(None, inserted)
+            return inserted
         _temp = arc.right
         arc.right = Arc(site, left=arc)
         arc.right.right = Arc(arc.site, left=arc.right, right=_temp)
         if _temp is not None:
             _temp.left = arc.right.right
+        self._beach_line.insert_after(arc, arc.right)
+        self._beach_line.insert_after(arc.right, arc.right.right)
         return arc.right
 
     def _remove_from_beach_line(self, arc):
-        if arc == self._beach_line:
-            self._beach_line = arc.right
+        self._beach_line.remove(arc)
         if arc.left is not None:
             arc.left.right = arc.right
         if arc.right is not None:
@@ -384,6 +415,10 @@ class Arc(object):
         self.left = left
         self.right = right
         self.circle_event = circle_event
+        # treap links, see BeachLine
+        self.parent = None
+        self.children = [None, None]
+        self.priority = 0.0
 
     def __iter__(self):
         item = self
@@ -403,9 +438,6 @@ class Arc(object):
 
 class FortuneEvent(object):
 
-    def __cmp__(self, other):
-        return cmp(self.y, other.y)
-
     @property
     def y(self):
         raise NotImplementedError()
@@ -459,6 +491,7 @@ def _build_circle_events(inserted=None, removed_on=None):
         if determinant(b - a, c - b) <= 0:
             yield CircleEvent(arc)
 
-v = Voronoi([Point(0.0, 0.0), Point(0.0, 1.0), Point(-0.5, 0.5)])
-v.vertices # [Point(-0.0, 0.5)]
-v.edges # [VoronoiEdge(...), ...]
\ No newline at end of file
+if __name__ == '__main__':
+    v = Voronoi([Point(0.0, 0.0), Point(0.0, 1.0), Point(-0.5, 0.5)])
+    print(v.vertices)  # [Point(-0.0, 0.5)]
+    print(v.edges)  # [VoronoiEdge(...), ...]
\ No newline at end of file